@@ -0,0 +1,208 @@
+import os
+import random
+
+import pytest
+
+import github_api_async
+import github_api_cache
+import github_api_cassette
+import github_api_client
+import github_api_coalesce
+import github_api_latency
+import github_api_pipeline
+import github_api_ratelimit
+import github_api_resilience
+import github_api_timing
+import github_api_tokens
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("github", "GitHub search suite")
+    group.addoption("--async-search", action="store_true", default=False,
+                    help="Send every search request of the session at once and let each test wait for its own.")
+    group.addoption("--search-concurrency", type=int, default=8,
+                    help="Maximum number of requests in flight in the async and pipeline modes (default: 8).")
+    group.addoption("--pipeline", action="store_true", default=bool(os.environ.get("GH_PIPELINE")),
+                    help="Send every search and its follow-up requests as chains across the session.")
+    group.addoption("--pipeline-rate", type=float, default=float(os.environ.get("GH_PIPELINE_RATE", 0)),
+                    help="Maximum requests per second of the pipeline mode (default: no limit).")
+    group.addoption("--graphql", action="store_true", default=bool(os.environ.get("GH_GRAPHQL")),
+                    help="Batch the follow-up lookups of the pipeline mode into GraphQL queries (needs --pipeline).")
+    group.addoption("--search-pages", type=int, default=None,
+                    help="Number of result pages checked by the tests that iterate the search items (default: 1).")
+    group.addoption("--search-items", type=int, default=None,
+                    help="Maximum number of search items checked per test (default: 1000).")
+    group.addoption("--stream-search", action="store_true", default=False,
+                    help="Parse the search responses while they are downloaded (also GH_STREAM_SEARCH=1).")
+    group.addoption("--coalesce", action="store_true", default=bool(os.environ.get("GH_COALESCE")),
+                    help="Share identical requests in flight and reuse their responses for the whole session.")
+    group.addoption("--cassette", choices=["record", "replay"], default=os.environ.get("GH_CASSETTE"),
+                    help="Record every request/response pair to a cassette or replay them without network.")
+    group.addoption("--cassette-dir", default=os.environ.get("GH_CASSETTE_DIR", "cassettes"),
+                    help="Directory of the cassettes (default: cassettes).")
+    group.addoption("--cassette-name", default=os.environ.get("GH_CASSETTE_NAME", "github"),
+                    help="Name of the cassette (default: github).")
+    group.addoption("--rate-limit", action="store_true", default=bool(os.environ.get("GH_RATE_LIMIT")),
+                    help="Pace the requests with token buckets shared by every worker of the runner.")
+    group.addoption("--rate-limit-state", default=os.environ.get("GH_RATE_LIMIT_STATE"),
+                    help="File holding the shared token buckets (default: in the temporary directory).")
+    group.addoption("--http-cache", default=os.environ.get("GH_HTTP_CACHE"),
+                    help="SQLite file of the conditional request cache (default: no cache).")
+    group.addoption("--http-cache-size", type=int, default=int(os.environ.get("GH_HTTP_CACHE_SIZE", 100)),
+                    help="Size limit of the cache in megabytes (default: 100).")
+    group.addoption("--latency-budgets", action="store_true", default=bool(os.environ.get("GH_LATENCY_BUDGETS")),
+                    help="Measure the searches of the tests with a latency budget and fail the ones over it.")
+    group.addoption("--latency-report", action="store_true", default=bool(os.environ.get("GH_LATENCY_REPORT")),
+                    help="Measure the searches with a latency budget and report the percentiles, without failing.")
+    group.addoption("--latency-calls", type=int, default=int(os.environ.get("GH_LATENCY_CALLS", 5)),
+                    help="Measured calls of every search with a latency budget (default: 5).")
+    group.addoption("--latency-warmup", type=int, default=int(os.environ.get("GH_LATENCY_WARMUP", 1)),
+                    help="Unmeasured warm-up calls before the measured ones (default: 1).")
+    group.addoption("--resilience", action="store_true", default=bool(os.environ.get("GH_RESILIENCE")),
+                    help="Hedge the slow searches and retry the failed or incomplete ones.")
+    group.addoption("--hedge-percentile", type=float, default=float(os.environ.get("GH_HEDGE_PERCENTILE", 95)),
+                    help="Latency percentile of its endpoint after which a search is sent again (default: 95).")
+    group.addoption("--timing", action="store_true", default=bool(os.environ.get("GH_TIMING")),
+                    help="Record the DNS, connect, TLS, first byte and download time of every request.")
+    group.addoption("--timing-trace", default=os.environ.get("GH_TIMING_TRACE", "github_timing.json"),
+                    help="JSON trace of the timed requests (default: github_timing.json).")
+
+
+class HtmlReport:
+    # Registered only when pytest-html is installed, which defines the hook.
+
+    def pytest_html_results_summary(self, prefix, summary, postfix, session):
+        if github_api_latency.results:
+            postfix.append(github_api_latency.html_table())
+        client = github_api_client.get_client()
+        for layer_class in (github_api_resilience.Resilience, github_api_timing.RequestTimer):
+            layer = client.find(layer_class)
+            if layer is not None:
+                postfix.append(layer.html_table())
+
+
+def pytest_configure(config):
+    # The batches gather the follow-ups of the pipeline's chains, without the pipeline there is nothing to batch.
+    if config.getoption("graphql") and not config.getoption("pipeline"):
+        raise pytest.UsageError("--graphql (GH_GRAPHQL) batches the follow-ups of the pipeline mode, "
+                                "add --pipeline (GH_PIPELINE=1).")
+
+    client = github_api_client.get_client()
+    # Layers installed on the shared client for this session, their summary() ends the terminal report.
+    config.github_layers = []
+
+    if config.getoption("search_pages"):
+        client.search_max_pages = config.getoption("search_pages")
+    if config.getoption("search_items"):
+        client.search_max_items = config.getoption("search_items")
+    if config.getoption("stream_search"):
+        client.stream_search = True
+
+    if config.getoption("coalesce"):
+        config.github_layers.append(client.use(github_api_coalesce.RequestCoalescer()))
+
+    mode = config.getoption("cassette")
+    # A replayed session has no latency to measure.
+    budgets, report = config.getoption("latency_budgets"), config.getoption("latency_report")
+    github_api_latency.configure((budgets or report) and mode != "replay", config.getoption("latency_calls"),
+                                 config.getoption("latency_warmup"), report_only=report and not budgets)
+    timing = config.getoption("timing") and mode != "replay"
+    resilience = config.getoption("resilience") and mode != "replay"
+    if (github_api_latency.settings["enabled"] or timing or resilience) and config.pluginmanager.hasplugin("html"):
+        config.pluginmanager.register(HtmlReport(), "github-html-report")
+
+    if mode:
+        config.github_layers.append(client.use(github_api_cassette.open_cassette(
+            mode, config.getoption("cassette_dir"), config.getoption("cassette_name"))))
+
+    # A replayed session never reaches the API, so there is nothing to cache or pace.
+    if mode == "replay":
+        return
+
+    if config.getoption("http_cache"):
+        config.github_layers.append(client.use(github_api_cache.HttpCache(
+            config.getoption("http_cache"), config.getoption("http_cache_size") * 1024 * 1024, client.raw_url)))
+
+    # Tokens in turn by their remaining quota, before the rate limiter whose buckets are per token. With a pool, the
+    # limiter hands the rate limit responses up so the pool tries another token instead of waiting for this one.
+    pool = len(client.tokens) > 1
+    limiter = None
+    if config.getoption("rate_limit"):
+        limiter = github_api_ratelimit.RateLimiter(config.getoption("rate_limit_state"), client.raw_url,
+                                                   retry_rate_limited=not pool)
+    if pool:
+        config.github_layers.append(client.use(github_api_tokens.TokenPool(client.tokens, client.raw_url, limiter)))
+    if limiter is not None:
+        config.github_layers.append(client.use(limiter))
+
+    if resilience:
+        # Above the rate limiter, so every hedge and retry is paced, and its transport layer below it.
+        layer = client.use(github_api_resilience.Resilience(config.getoption("hedge_percentile")))
+        config.github_layers += [layer, client.use(layer.transport)]
+
+    if timing:
+        github_api_timing.install(client)
+        config.github_layers.append(client.use(github_api_timing.RequestTimer(config.getoption("timing_trace"))))
+
+
+def pytest_unconfigure(config):
+    client = github_api_client.get_client()
+    for layer in getattr(config, "github_layers", []):
+        client.remove(layer)
+        if hasattr(layer, "close"):
+            layer.close()
+        if isinstance(layer, github_api_timing.RequestTimer):
+            github_api_timing.uninstall(client)
+
+
+def search_tests(items):
+    for item in items:
+        cls = getattr(item, "cls", None)
+        if cls is not None and issubclass(cls, github_api_client.GithubSearchTestCase):
+            yield item, cls
+
+
+def pytest_collection_finish(session):
+    config = session.config
+    if config.getoption("collectonly"):
+        return
+
+    if config.getoption("pipeline"):
+        github_api_pipeline.start(github_api_client.get_client(), config.getoption("search_concurrency"),
+                                  config.getoption("pipeline_rate"), config.getoption("graphql"))
+        for item, cls in search_tests(session.items):
+            github_api_pipeline.submit_test(item.obj, cls.search_path, item.nodeid)
+        github_api_pipeline.submitted()
+        return
+
+    if not config.getoption("async_search"):
+        return
+
+    runner = github_api_async.start(github_api_client.get_client(), config.getoption("search_concurrency"))
+    for item, cls in search_tests(session.items):
+        for params, auth, text_match in github_api_async.discover_searches(item.obj):
+            runner.submit(cls.search_path, params, auth, text_match, item.nodeid)
+
+
+def pytest_runtest_setup(item):
+    # Tests that pick a random repository must pick the same one when a cassette is recorded and replayed.
+    if item.config.getoption("cassette"):
+        # Not the node id: it depends on the rootdir, which an existing --cassette-dir can move.
+        random.seed(f"{item.module.__name__}.{item.cls.__name__ if item.cls else ''}.{item.name}")
+
+
+def pytest_sessionfinish(session):
+    github_api_async.stop()
+    github_api_pipeline.stop()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    summaries = [layer.summary() for layer in config.github_layers if hasattr(layer, "summary")]
+    if github_api_latency.results:
+        summaries.append(github_api_latency.summary())
+    if config.getoption("pipeline"):
+        summaries.append(github_api_pipeline.summary())
+    if summaries:
+        terminalreporter.write_sep("-", "github client")
+        for summary in summaries:
+            terminalreporter.write_line(summary)
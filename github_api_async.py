@@ -0,0 +1,103 @@
+import ast
+import inspect
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import github_api_client
+
+# Concurrent execution mode: every search request of the session is sent up front on a pool of "concurrency"
+# threads, which is also the limit of requests in flight, and each test then waits only for its own response inside
+# make_request.
+
+
+def discover_searches(test_method):
+    # Returns the literal self.make_request(params[, auth][, text_match=...]) calls of a test method as
+    # (params, auth, text_match) triples.
+    tree = ast.parse(textwrap.dedent(inspect.getsource(test_method)))
+    searches = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            continue
+        if node.func.attr != "make_request" or not node.args:
+            continue
+        if not isinstance(node.args[0], ast.Constant) or not isinstance(node.args[0].value, str):
+            continue
+
+        auth = True
+        text_match = False
+        if len(node.args) > 1 and isinstance(node.args[1], ast.Constant):
+            auth = bool(node.args[1].value)
+        for keyword in node.keywords:
+            if keyword.arg == "auth" and isinstance(keyword.value, ast.Constant):
+                auth = bool(keyword.value.value)
+            elif keyword.arg == "text_match" and isinstance(keyword.value, ast.Constant):
+                text_match = bool(keyword.value.value)
+        searches.append((node.args[0].value, auth, text_match))
+    return searches
+
+
+class AsyncSearchRunner:
+
+    def __init__(self, client, concurrency=8):
+        self.client = client
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix="github-search")
+
+        # (kind, params, auth, text_match) -> [future, number of tests still waiting for it]
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def submit(self, kind, params, auth=True, text_match=False, test=None):
+        # test: node id of the test the search is sent for, the first one when several tests send the same search.
+        key = (kind, params, auth, text_match)
+        with self.lock:
+            if key in self.pending:
+                self.pending[key][1] += 1
+            else:
+                future = self.executor.submit(github_api_client.send_for, test, self.client.search, kind, params,
+                                              auth=auth, text_match=text_match)
+                self.pending[key] = [future, 1]
+            return self.pending[key][0]
+
+    def take(self, kind, params, auth=True, text_match=False):
+        key = (kind, params, auth, text_match)
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                return None
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.pending[key]
+            return entry[0]
+
+    def close(self):
+        with self.lock:
+            for future, _ in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+runner = None
+
+
+def start(client, concurrency=8):
+    global runner
+    stop()
+    runner = AsyncSearchRunner(client, concurrency)
+    return runner
+
+
+def stop():
+    global runner
+    if runner is not None:
+        runner.close()
+        runner = None
+
+
+def take(kind, params, auth=True, text_match=False):
+    # Future of a search already sent by the runner, or None when the async mode is off.
+    if runner is None:
+        return None
+    return runner.take(kind, params, auth, text_match)
@@ -0,0 +1,166 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import github_api_client
+
+# Persistent HTTP cache for the shared client, stored in SQLite.
+# A response younger than the TTL of its endpoint is served without any request. An older one is revalidated with
+# If-None-Match / If-Modified-Since: GitHub answers 304 without counting it against the rate limit, and the stored
+# body is served again. The least recently used entries are evicted when the cache is over its size limit.
+
+# Time to live in seconds of each kind of resource, the first matching path wins.
+TTLS = [
+    (r"^/search/", 60),
+    (r"^/users/[^/]+/(followers|repos)$", 600),
+    (r"^/users/[^/]+$", 3600),
+    (r"^/repos/[^/]+/[^/]+/issues", 300),
+    (r"^/repos/[^/]+/[^/]+/(contents|readme)", 600),
+]
+DEFAULT_TTL = 300
+RAW_TTL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    reason TEXT,
+    url TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+class HttpCache:
+    order = 30
+    caching = True
+
+    def __init__(self, path, max_size=100 * 1024 * 1024, raw_url=None, ttls=None):
+        self.path = path
+        self.max_size = max_size
+        self.raw_host = urlsplit(raw_url).netloc if raw_url else "raw.githubusercontent.com"
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in (ttls or TTLS)]
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute(SCHEMA)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.db.commit()
+
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl(self, request):
+        url = urlsplit(request.url)
+        if url.netloc == self.raw_host:
+            return RAW_TTL
+        for pattern, ttl in self.ttls:
+            if pattern.search(url.path):
+                return ttl
+        return DEFAULT_TTL
+
+    def load(self, key):
+        with self.lock:
+            return self.db.execute(
+                "SELECT status, reason, url, headers, body, etag, last_modified, stored_at FROM responses "
+                "WHERE key = ?", (key,)).fetchone()
+
+    def touch(self, key, now, stored_at=None, headers=None):
+        with self.lock:
+            if stored_at is None:
+                self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            else:
+                self.db.execute("UPDATE responses SET accessed_at = ?, stored_at = ?, headers = ? WHERE key = ?",
+                                (now, stored_at, json.dumps(headers), key))
+            self.db.commit()
+
+    def store(self, key, response, now):
+        body = response.content
+        headers = github_api_client.stored_headers(response)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, response.status_code, response.reason, response.url, json.dumps(headers), body,
+                 response.headers.get("ETag"), response.headers.get("Last-Modified"), len(body), now, now))
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def __call__(self, request, send, **kwargs):
+        if request.method != "GET":
+            return send(request, **kwargs)
+
+        key = github_api_client.request_key(request)
+        now = time.time()
+        entry = self.load(key)
+        if entry is None:
+            return self.fetch(key, request, send, now, **kwargs)
+
+        status, reason, url, headers, body, etag, last_modified, stored_at = entry
+        headers = json.loads(headers)
+        if now - stored_at < self.ttl(request):
+            self.touch(key, now)
+            with self.lock:
+                self.hits += 1
+            return github_api_client.build_response(request, status, reason, headers, body, url)
+
+        if not etag and not last_modified:
+            return self.fetch(key, request, send, now, **kwargs)
+
+        if etag:
+            request.headers["If-None-Match"] = etag
+        if last_modified:
+            request.headers["If-Modified-Since"] = last_modified
+        response = send(request, **kwargs)
+        if response.status_code != 304:
+            if response.status_code == 200:
+                self.store(key, response, now)
+            with self.lock:
+                self.misses += 1
+            return response
+
+        # Not modified: keep the stored body, with the fresh rate limit headers of the 304. The 304 is closed, a
+        # streamed one would keep its connection out of the pool.
+        response.close()
+        headers.update(github_api_client.stored_headers(response))
+        self.touch(key, now, now, headers)
+        with self.lock:
+            self.revalidations += 1
+        return github_api_client.build_response(request, status, reason, headers, body, url)
+
+    def fetch(self, key, request, send, now, **kwargs):
+        response = send(request, **kwargs)
+        if response.status_code == 200:
+            self.store(key, response, now)
+        with self.lock:
+            self.misses += 1
+        return response
+
+    def summary(self):
+        return (f"http cache: {self.hits} hits, {self.revalidations} revalidated (304), {self.misses} misses, "
+                f"{self.evictions} evicted")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,128 @@
+import glob
+import json
+import mmap
+import os
+import threading
+import zlib
+
+import github_api_client
+
+# Record/replay layer for the shared client.
+# A cassette is a pair of files: "<name>.cassette" holds the zlib compressed responses back to back and
+# "<name>.index" maps each normalized request to the offset and length of its record, one JSON line per record.
+# Both are appended and flushed as the responses arrive, so a recording that crashed or was killed still replays
+# every record written before. In the replay mode the data files are memory mapped and no request ever reaches the
+# network.
+
+class CassetteMissError(LookupError):
+    pass
+
+
+def encode_record(response):
+    headers = github_api_client.stored_headers(response)
+    meta = {"status": response.status_code, "reason": response.reason, "url": response.url, "headers": headers}
+    return zlib.compress(json.dumps(meta).encode() + b"\n" + response.content)
+
+
+def decode_record(data, request):
+    meta, body = zlib.decompress(data).split(b"\n", 1)
+    meta = json.loads(meta)
+    return github_api_client.build_response(request, meta["status"], meta["reason"], meta["headers"], body, meta["url"])
+
+
+def read_index(index_path, data_size):
+    # (key, offset, length) of the complete records. The last line of a killed recording may be cut, and a record
+    # repeated later replaces the earlier one.
+    entries = []
+    with open(index_path) as index_file:
+        lines = index_file.read().splitlines()
+    for line in lines:
+        try:
+            key, offset, length = json.loads(line)
+        except ValueError:
+            continue
+        if offset + length <= data_size:
+            entries.append((key, offset, length))
+    return entries
+
+
+class CassetteRecorder:
+    order = 20
+    caching = True
+
+    def __init__(self, directory, name="github"):
+        os.makedirs(directory, exist_ok=True)
+        # Every pytest-xdist worker records its own cassette, the replay reads all of them.
+        worker = os.environ.get("PYTEST_XDIST_WORKER")
+        basename = f"{name}-{worker}" if worker else name
+        self.data_path = os.path.join(directory, f"{basename}.cassette")
+        self.index_path = os.path.join(directory, f"{basename}.index")
+        # The files are only created by the first request, so an xdist controller leaves no empty cassette.
+        self.data = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    def __call__(self, request, send, **kwargs):
+        response = send(request, **kwargs)
+        record = encode_record(response)
+        with self.lock:
+            if self.data is None:
+                self.data = open(self.data_path, "wb")
+                self.index = open(self.index_path, "w")
+            offset = self.data.tell()
+            self.data.write(record)
+            # The record is on disk before its index line, so every indexed record is complete.
+            self.data.flush()
+            self.index.write(json.dumps([github_api_client.request_key(request), offset, len(record)]) + "\n")
+            self.index.flush()
+        return response
+
+    def close(self):
+        with self.lock:
+            if self.data is None:
+                return
+            self.data.close()
+            self.index.close()
+            self.data = self.index = None
+
+
+class CassettePlayer:
+    order = 20
+    caching = True
+
+    def __init__(self, directory, name="github"):
+        self.maps = []
+        self.index = {}
+        index_paths = sorted(glob.glob(os.path.join(directory, f"{name}.index")) +
+                             glob.glob(os.path.join(directory, f"{name}-*.index")))
+        if not index_paths:
+            raise FileNotFoundError(f"No cassette named '{name}' in {directory}.")
+
+        for index_path in index_paths:
+            data_path = index_path[:-len(".index")] + ".cassette"
+            with open(data_path, "rb") as data_file:
+                data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(data_path) else b""
+            for key, offset, length in read_index(index_path, len(data)):
+                self.index[key] = (len(self.maps), offset, length)
+            self.maps.append(data)
+
+    def __call__(self, request, send, **kwargs):
+        key = github_api_client.request_key(request)
+        if key not in self.index:
+            raise CassetteMissError(f"Request not recorded in the cassette: {key}")
+        data_index, offset, length = self.index[key]
+        return decode_record(self.maps[data_index][offset:offset + length], request)
+
+    def close(self):
+        for data in self.maps:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self.maps = []
+
+
+def open_cassette(mode, directory, name="github"):
+    if mode == "record":
+        return CassetteRecorder(directory, name)
+    if mode == "replay":
+        return CassettePlayer(directory, name)
+    raise ValueError(f"Unknown cassette mode: {mode}")
@@ -0,0 +1,405 @@
+import functools
+import hashlib
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import github_api_async
+import github_api_columns
+import github_api_pipeline
+import github_api_records
+import github_api_stream
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Shared HTTP client used by the search test modules.
+# Every setting can be overridden through the environment so the suite can be pointed at a local stand-in server.
+API_URL = "https://api.github.com"
+RAW_URL = "https://raw.githubusercontent.com"
+
+# Headers that describe the original transfer and are not true for a stored (decoded) body.
+TRANSFER_HEADERS = ("content-encoding", "transfer-encoding", "content-length", "connection")
+
+# Media types of the API: the default JSON, and the same with the "text_matches" of every search item.
+JSON_MEDIA_TYPE = "application/vnd.github+json"
+TEXT_MATCH_MEDIA_TYPE = "application/vnd.github.text-match+json"
+
+# File names tried on the raw host when the API cannot tell which file is the README.
+README_NAMES = ("README.md", "README.rst", "README", "readme.md", "README.txt", "README.markdown", "Readme.md")
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def media_type(request):
+    # The media type asked for when it is not the default one, the responses differ (text matches, raw files).
+    accept = request.headers.get("Accept", JSON_MEDIA_TYPE)
+    return "" if accept == JSON_MEDIA_TYPE else f" {accept}"
+
+
+def request_key(request):
+    # Normalized request: method, URL with sorted query parameters, whether it was authenticated, the media type when
+    # it is not the default one and the hash of the body if any (GraphQL queries). The token itself is never part of
+    # the key.
+    url = urlsplit(request.url)
+    query = urlencode(sorted(parse_qsl(url.query, keep_blank_values=True)))
+    auth = "auth" if request.headers.get("Authorization") else "anon"
+    key = f"{request.method} {url.scheme}://{url.netloc}{url.path}?{query} {auth}{media_type(request)}"
+    if request.body:
+        body = request.body.encode() if isinstance(request.body, str) else request.body
+        key += " " + hashlib.sha1(body).hexdigest()
+    return key
+
+
+def authorization_id(authorization):
+    # Short stable name of a token, without exposing it.
+    if not authorization:
+        return "anon"
+    return hashlib.sha1(authorization.encode()).hexdigest()[:10]
+
+
+def token_id(request):
+    return authorization_id(request.headers.get("Authorization"))
+
+
+# Test on whose behalf the current thread sends requests, when it is not the running one: the async and pipeline
+# modes send them ahead, while another test runs.
+SESSION = "(session)"
+_sender = threading.local()
+
+
+def send_for(test, send, *args, **kwargs):
+    # Calls send(*args, **kwargs) on behalf of a test (its node id), or of the session when test is None.
+    previous = getattr(_sender, "test", None)
+    _sender.test = test or SESSION
+    try:
+        return send(*args, **kwargs)
+    finally:
+        _sender.test = previous
+
+
+def current_test():
+    # Node id of the test the current thread sends requests for: the one given to send_for, else the running one
+    # ("github_api_repo.py::GithubSearchTests::test_repo_search_by_name (call)"), else the session.
+    sender = getattr(_sender, "test", None)
+    if sender:
+        return sender
+    test = os.environ.get("PYTEST_CURRENT_TEST")
+    return test.rsplit(" ", 1)[0] if test else SESSION
+
+
+def close_unused(kept, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    response = future.result()
+    if id(response) not in kept:
+        response.close()
+
+
+def stored_headers(response):
+    return {name: value for name, value in response.headers.items() if name.lower() not in TRANSFER_HEADERS}
+
+
+def build_response(request, status, reason, headers, body, url=None):
+    # Response served without network (cassette, cache, ...): the body is already read.
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(headers)
+    response.headers["Content-Length"] = str(len(body))
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = url or request.url
+    response.request = request
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+class GithubClient:
+
+    def __init__(self, base_url=None, raw_url=None, token=None, pool_size=None, pool_hosts=None,
+                 connect_timeout=None, read_timeout=None):
+        self.base_url = (base_url or os.environ.get("GH_API_URL") or API_URL).rstrip("/")
+        self.raw_url = (raw_url or os.environ.get("GH_RAW_URL") or RAW_URL).rstrip("/")
+        # GH_TOKENS="token1,token2,..." is a pool the TokenPool layer rotates through, see github_api_tokens.
+        if token is not None:
+            self.tokens = [token]
+        else:
+            self.tokens = [value.strip() for value in os.environ.get("GH_TOKENS", "").split(",") if value.strip()] \
+                or [os.environ.get("GH_TOKEN")]
+        self.token = self.tokens[0]
+        self.pool_size = pool_size or env_int("GH_POOL_SIZE", 10)
+        self.timeout = (connect_timeout or env_float("GH_CONNECT_TIMEOUT", 5.0),
+                        read_timeout or env_float("GH_READ_TIMEOUT", 30.0))
+        # How far iter_items follows the search results (GitHub stops at 1000 results anyway).
+        self.search_max_pages = env_int("GH_SEARCH_MAX_PAGES", 1)
+        self.search_max_items = env_int("GH_SEARCH_MAX_ITEMS", 1000)
+        # Search responses are downloaded while iter_items parses them, instead of before.
+        self.stream_search = bool(os.environ.get("GH_STREAM_SEARCH"))
+
+        # One keep-alive pool per host (api.github.com, raw.githubusercontent.com, ...).
+        # The urllib3 pools are thread safe, so the session can be shared by every test and worker thread.
+        adapter = HTTPAdapter(pool_connections=pool_hosts or env_int("GH_POOL_HOSTS", 4),
+                              pool_maxsize=self.pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept"] = JSON_MEDIA_TYPE
+
+        # Layers wrapped around the transport (cassettes, cache, rate limiting, ...), see use().
+        self.middleware = []
+
+    def auth_headers(self):
+        if self.token:
+            return {"Authorization": f"token {self.token}"}
+        return {}
+
+    def url(self, path):
+        # Full URLs (e.g. "followers_url" from a response) are used as they are.
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, url, auth=True, headers=None, **kwargs):
+        request_headers = self.auth_headers() if auth else {}
+        if headers:
+            request_headers.update(headers)
+        request = requests.Request("GET", self.url(url), headers=request_headers)
+        return self.send(self.session.prepare_request(request), **kwargs)
+
+    def graphql(self, query, auth=True, **kwargs):
+        # GraphQL needs a token on GitHub.
+        request = requests.Request("POST", self.url("/graphql"), headers=self.auth_headers() if auth else {},
+                                   json={"query": query})
+        return self.send(self.session.prepare_request(request), **kwargs)
+
+    def use(self, middleware):
+        # A middleware is called as middleware(request, send=next_layer, **kwargs) and returns a response.
+        # Layers run in ascending "order": the lowest one sees the request first and the response last.
+        self.middleware = sorted(self.middleware + [middleware], key=lambda layer: layer.order)
+        return middleware
+
+    def remove(self, middleware):
+        self.middleware = [layer for layer in self.middleware if layer is not middleware]
+
+    def find(self, middleware_class):
+        for layer in self.middleware:
+            if isinstance(layer, middleware_class):
+                return layer
+        return None
+
+    def send(self, request, uncached=False, **kwargs):
+        # An uncached request (e.g. a latency measurement) skips the "caching" layers that can answer or record it
+        # without a real round trip: coalescing, cassettes and the HTTP cache.
+        kwargs.setdefault("timeout", self.timeout)
+        send = self.session.send
+        for layer in reversed(self.middleware):
+            if uncached and getattr(layer, "caching", False):
+                continue
+            send = functools.partial(layer, send=send)
+        return send(request, **kwargs)
+
+    def search(self, kind, params, auth=True, text_match=False, **kwargs):
+        # text_match: every item comes with its "text_matches", the fragments of its properties matching the keywords.
+        kwargs.setdefault("stream", self.stream_search)
+        if text_match:
+            kwargs["headers"] = dict(kwargs.get("headers") or {}, Accept=TEXT_MATCH_MEDIA_TYPE)
+        return self.get(f"/search/{kind}?{params}", auth=auth, **kwargs)
+
+    def iter_items(self, response, fields=None, max_items=None, max_pages=None, record=None):
+        # Yields the "items" of a search response, then of the next pages given by the Link headers.
+        # The items are parsed incrementally and only keep the dotted "fields" when they are given, or are decoded
+        # into compact "record" objects (see github_api_records).
+        # The next page is requested in the background while the caller checks the current one.
+        max_items = max_items or self.search_max_items
+        max_pages = max_pages or self.search_max_pages
+        auth = "Authorization" in response.request.headers
+        # The next pages in the same media type (e.g. with text matches).
+        accept = {"Accept": response.request.headers.get("Accept", JSON_MEDIA_TYPE)}
+        executor = ThreadPoolExecutor(1, thread_name_prefix="github-page")
+        pages = 0
+        count = 0
+        following = None
+        try:
+            while response is not None:
+                response.raise_for_status()
+                pages += 1
+
+                next_url = response.links.get("next", {}).get("url")
+                if next_url and pages < max_pages:
+                    following = executor.submit(self.get, next_url, auth, accept, stream=self.stream_search)
+
+                for item in self.page_items(response, fields, record):
+                    yield item
+                    count += 1
+                    if count >= max_items:
+                        return
+                response.close()
+                response = following.result() if following is not None else None
+                following = None
+        finally:
+            # Stopping early (a failed assertion, max_items) drops the downloads still running.
+            executor.shutdown(wait=False, cancel_futures=True)
+            if response is not None:
+                response.close()
+            if following is not None and following.done() and not following.cancelled():
+                following.result().close()
+
+    def page_items(self, response, fields=None, record=None):
+        if record is None:
+            return github_api_stream.ItemStream.from_response(response, fields)
+        if self.stream_search:
+            return github_api_records.stream_records(response, record)
+        # The page is already downloaded: one pass of the (C) decoder over the bytes beats the incremental parser.
+        return github_api_records.decode_page(response.content, record)[1]
+
+    def raw(self, user, repo_name, branch, path, auth=True, **kwargs):
+        return self.get(f"{self.raw_url}/{user}/{repo_name}/{branch}/{path}", auth=auth, **kwargs)
+
+    def readme(self, user, repo_name, branch, auth=True):
+        # Streamed response with the README of a repository whatever its file name, or None when it has none.
+        # The /readme endpoint finds the file and sends it raw in one request; if it fails, the usual file names are
+        # tried in parallel on the raw host and the first one found wins.
+        response = self.get(f"/repos/{user}/{repo_name}/readme", auth,
+                            headers={"Accept": "application/vnd.github.raw"}, stream=True)
+        if response.status_code == 200:
+            return response
+        response.close()
+
+        urls = [f"{self.raw_url}/{user}/{repo_name}/{branch}/{name}" for name in README_NAMES]
+        responses = self.fetch_all(urls, auth, stream=True, stop_when=lambda response: response.status_code == 200)
+        found = next((response for response in responses if response is not None and response.status_code == 200),
+                     None)
+        for response in responses:
+            if response is not None and response is not found:
+                response.close()
+        return found
+
+    def fetch_all(self, urls, auth=True, max_workers=8, fail_fast=False, stop_when=None, **kwargs):
+        # Fetches the URLs in parallel and returns the responses in the same order as the URLs.
+        # fail_fast raises the first error (including 4xx/5xx statuses) as soon as it arrives, and stop_when(response)
+        # returning True stops as soon as the answer is known. The fetches not started yet are cancelled and stay None.
+        results = [None] * len(urls)
+        if not urls:
+            return results
+
+        executor = ThreadPoolExecutor(min(max_workers, len(urls)), thread_name_prefix="github-fetch")
+        futures = {executor.submit(self.get, url, auth, **kwargs): index for index, url in enumerate(urls)}
+        error = None
+        raising = True
+        try:
+            for future in as_completed(futures):
+                try:
+                    response = future.result()
+                    if fail_fast:
+                        response.raise_for_status()
+                except Exception as exception:
+                    if fail_fast:
+                        raise
+                    error = error or exception
+                    continue
+                results[futures[future]] = response
+                if stop_when is not None and stop_when(response):
+                    break
+            raising = error is not None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            # The responses nobody reads are closed: the fetches still running after a stop, or all of them when
+            # raising. A fetch still running is closed when it arrives.
+            kept = set() if raising else {id(response) for response in results if response is not None}
+            for future in futures:
+                if not future.cancel():
+                    future.add_done_callback(functools.partial(close_unused, kept))
+
+        if error is not None:
+            raise error
+        return results
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # The client lives for the whole test session so the connections are reused between tests.
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GithubClient()
+    return _client
+
+
+def reset_client(**kwargs):
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = GithubClient(**kwargs)
+    return _client
+
+
+class GithubSearchTestCase(unittest.TestCase):
+    # Search endpoint used by make_request: "repositories", "users" or "code".
+    search_path = "repositories"
+
+    def setUp(self):
+        self.client = get_client()
+        self.headers = self.client.auth_headers()
+
+    def make_request(self, params, auth=True, text_match=False):
+        # In the async and pipeline modes the request was already sent when the session started.
+        pending = github_api_async.take(self.search_path, params, auth, text_match) or \
+            github_api_pipeline.take_search(self.search_path, params, auth, text_match)
+        if pending is not None:
+            return pending.result()
+        return self.client.search(self.search_path, params, auth=auth, text_match=text_match)
+
+    def fetch(self, url, auth=True):
+        # A follow-up request of the test, already sent in the pipeline mode when it is one of its @follow_ups.
+        pending = github_api_pipeline.take_url(self.client.url(url), auth)
+        if pending is not None:
+            return pending.result()
+        return self.client.get(url, auth)
+
+    def iter_records(self, response, **kwargs):
+        # The items of a search response and its next pages as records of the endpoint (Repository, User, ...).
+        return self.client.iter_items(response, record=github_api_records.RECORDS[self.search_path], **kwargs)
+
+    def assertStreamContains(self, response, term, msg=None):
+        # Looks for the term (case-insensitive) while the body is downloaded and stops the download once it is found.
+        if not github_api_stream.response_contains(response, term):
+            self.fail(self._formatMessage(msg, f"{term!r} not found in {response.url}"))
+
+    def assertTextMatch(self, items, term, properties=None, msg=None):
+        # Checks that every item has a text match of the term in one of the properties, from the search response alone
+        # (make_request(..., text_match=True)), and reports all the offenders.
+        index = github_api_records.TextMatchIndex(items)
+        if not index.requested():
+            self.fail(self._formatMessage(msg, "The search response has no text matches, use text_match=True."))
+        missing = index.missing(term, properties)
+        if missing:
+            where = "any property" if properties is None else \
+                properties if isinstance(properties, str) else " or ".join(properties)
+            self.fail(self._formatMessage(msg, f"{len(missing)} of {index.size} items without a match of {term!r} "
+                                               f"in {where}: items {missing[:10]}"))
+
+    def assertQualifier(self, items, qualifier, msg=None):
+        # Checks every item against a search qualifier at once (see github_api_columns) and reports all the offenders.
+        failed = github_api_columns.offenders(items, qualifier)
+        if failed:
+            self.fail(self._formatMessage(msg, github_api_columns.offenders_message(qualifier, failed)))
@@ -0,0 +1,105 @@
+import re
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import github_api_client
+
+# Session-wide request coalescing for the shared client.
+# Requests are keyed by a normalized URL: the query parameters are sorted, and so are the qualifiers of the search "q"
+# ("user:x+python" and "python+user:x" are the same search). The keywords and the boolean operators keep their order
+# ("python NOT java" is not "java NOT python"), and so does a qualifier next to an operator. A request identical to
+# one in flight waits for it instead of going to the network, and a successful response is reused by every identical
+# request of the session.
+
+TERM = re.compile(r'-?\w[\w.-]*:"[^"]*"|"[^"]*"|\S+')
+QUALIFIER = re.compile(r'^-?\w[\w.-]*:.')
+OPERATORS = ("NOT", "OR", "AND")
+
+
+def normalize_search(value):
+    # The keywords and operators in place, then the qualifiers that no operator applies to, sorted.
+    terms = TERM.findall(value)
+    kept, qualifiers = [], []
+    for index, term in enumerate(terms):
+        operands = terms[max(0, index - 1):index] + terms[index + 1:index + 2]
+        if QUALIFIER.match(term) and not any(operand in OPERATORS for operand in operands):
+            qualifiers.append(term)
+        else:
+            kept.append(term)
+    return " ".join(kept + sorted(qualifiers))
+
+
+def normalize_query(query):
+    params = []
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if name == "q":
+            value = normalize_search(value)
+        params.append((name, value))
+    return urlencode(sorted(params))
+
+
+def coalesce_key(request):
+    url = urlsplit(request.url)
+    token = github_api_client.token_id(request)
+    return (f"{request.method} {url.scheme}://{url.netloc}{url.path}?{normalize_query(url.query)} {token}"
+            f"{github_api_client.media_type(request)}")
+
+
+class RequestCoalescer:
+    order = 10
+    caching = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> Future of (status, reason, headers, body, url)
+        self.responses = {}
+        self.sent = 0
+        self.in_flight = Counter()
+        self.reused = Counter()
+
+    def __call__(self, request, send, **kwargs):
+        if request.method != "GET":
+            return send(request, **kwargs)
+
+        key = coalesce_key(request)
+        with self.lock:
+            future = self.responses.get(key)
+            if future is None:
+                future = self.responses[key] = Future()
+                owner = True
+                self.sent += 1
+            else:
+                owner = False
+                (self.reused if future.done() else self.in_flight)[key] += 1
+
+        if not owner:
+            status, reason, headers, body, url = future.result()
+            return github_api_client.build_response(request, status, reason, headers, body, url)
+
+        try:
+            response = send(request, **kwargs)
+            # The body is read once here so every waiting request can get its own copy.
+            record = (response.status_code, response.reason, github_api_client.stored_headers(response),
+                      response.content, response.url)
+        except Exception as exception:
+            with self.lock:
+                del self.responses[key]
+            future.set_exception(exception)
+            raise
+
+        if response.status_code != 200:
+            # Only successful responses are reused; the requests already waiting still share this one.
+            with self.lock:
+                del self.responses[key]
+        future.set_result(record)
+        return response
+
+    def summary(self, limit=20):
+        saved = self.in_flight + self.reused
+        lines = [f"coalescing: {self.sent} requests sent, {sum(saved.values())} saved "
+                 f"({sum(self.in_flight.values())} joined in flight, {sum(self.reused.values())} reused)"]
+        for key, count in saved.most_common(limit):
+            lines.append(f"  {count} x {key}")
+        return "\n".join(lines)
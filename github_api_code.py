@@ -1,12 +1,15 @@
-import requests
 import unittest
 
+import github_api_client
+import github_api_latency
 
-class GithubSearchTests(unittest.TestCase):
 
+class GithubSearchTests(github_api_client.GithubSearchTestCase):
+    search_path = "code"
+
+    @github_api_latency.budget(p95=1500)
     def test_search_code(self):
-        code_data = requests.get(
-            'https://api.github.com/search/code?q=phage+in:file+extension:md+user:voorloopnul')
+        code_data = self.make_request('q=phage+in:file+extension:md+user:voorloopnul', text_match=True)
         code_data_json = code_data.json()
         code_data_response = code_data_json["items"]
 
@@ -14,9 +17,8 @@ class GithubSearchTests(unittest.TestCase):
         filename = code_data_response[0]["name"]
         assert ".md" == filename[-3:], "This file there's not '.md' extension"
 
-        # a word 'phage' in this file
-        description = code_data_response[0]["repository"]["description"]
-        assert "phage" in description, "There's no 'phage' in the description"
+        # a word 'phage' in every file found, from the text matches of the search response
+        self.assertTextMatch(code_data_response, "phage", "content", "There's no 'phage' in the file")
 
 
 if __name__ == '__main__':
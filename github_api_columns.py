@@ -0,0 +1,140 @@
+import re
+
+import numpy as np
+
+import github_api_records
+
+# Batch checks of search qualifiers.
+# The items are turned into typed columns (int64 counts, datetime64 dates, strings, booleans) and a qualifier such as
+# "size:<=100" or "created:<=2021-01-01" is checked with one vectorized comparison over the whole column.
+# The result is the list of every offending (index, value), not only the first one.
+
+# Qualifier -> (item field, column type).
+QUALIFIERS = {
+    "size": ("size", "int"),
+    "stars": ("stargazers_count", "int"),
+    "forks": ("forks_count", "int"),
+    "followers": ("watchers_count", "int"),
+    "created": ("created_at", "date"),
+    "pushed": ("pushed_at", "date"),
+    "language": ("language", "text"),
+    "license": ("license.key", "text"),
+    "user": ("owner.login", "text"),
+    "org": ("owner.login", "text"),
+    "topic": ("topics", "list"),
+    "topics": ("topics", "count"),
+    "archived": ("archived", "bool"),
+    "mirror": ("mirror_url", "present"),
+}
+
+# "<keyword> in:<field>" qualifiers.
+IN_FIELDS = {
+    "name": "name",
+    "description": "description",
+}
+
+RANGE = re.compile(r"^(>=|<=|>|<)?(.+)$")
+
+
+def field_value(item, field):
+    if isinstance(item, github_api_records.Record):
+        return item.value(field)
+    for part in field.split("."):
+        if not isinstance(item, dict):
+            return None
+        item = item.get(part)
+    return item
+
+
+def present(values):
+    return np.array([value is not None for value in values], dtype=bool)
+
+
+def column(values, kind):
+    if kind in ("int", "count"):
+        # A missing value gets a placeholder, the masks then reject it with present().
+        return np.array([-1 if value is None else value for value in values], dtype=np.int64)
+    if kind == "date":
+        # "2021-01-01T10:00:00Z" -> day precision, the qualifiers compare dates.
+        days = [value[:10] if value else "NaT" for value in values]
+        return np.array(days, dtype="datetime64[D]")
+    if kind == "bool":
+        return np.array([value is True for value in values], dtype=bool)
+    if kind == "present":
+        return present(values)
+    return np.array(["" if value is None else str(value).lower() for value in values], dtype=str)
+
+
+def compare(values, operator, bound):
+    if operator == ">=":
+        return values >= bound
+    if operator == "<=":
+        return values <= bound
+    if operator == ">":
+        return values > bound
+    if operator == "<":
+        return values < bound
+    return values == bound
+
+
+def range_mask(values, condition, parse):
+    if ".." in condition:
+        low, high = condition.split("..", 1)
+        mask = np.ones(len(values), dtype=bool)
+        if low != "*":
+            mask &= values >= parse(low)
+        if high != "*":
+            mask &= values <= parse(high)
+        return mask
+    operator, bound = RANGE.match(condition).groups()
+    return compare(values, operator, parse(bound))
+
+
+def parse_qualifier(qualifier):
+    # Returns (field, kind, condition) of "size:<=100", "topic:python" or "python in:name".
+    keyword, _, in_field = qualifier.partition(" in:")
+    if in_field:
+        return IN_FIELDS[in_field], "contains", keyword.lower()
+    name, _, condition = qualifier.partition(":")
+    field, kind = QUALIFIERS[name]
+    return field, kind, condition
+
+
+def mask_for(values, kind, condition):
+    # A missing count or date matches no condition, like NaT: the item is reported.
+    if kind == "int":
+        return range_mask(column(values, kind), condition, int) & present(values)
+    if kind == "count":
+        return range_mask(column([len(value or []) for value in values], kind), condition, int) & present(values)
+    if kind == "date":
+        dates = column(values, kind)
+        return range_mask(dates, condition, lambda day: np.datetime64(day, "D")) & ~np.isnat(dates)
+    if kind in ("bool", "present"):
+        return column(values, kind) == (condition.lower() == "true")
+    if kind == "contains":
+        return np.char.find(column(values, "text"), condition) >= 0
+    if kind == "list":
+        # Every topic of every item in one flat array, with the index of the item that owns it.
+        lengths = np.array([len(value or []) for value in values], dtype=np.int64)
+        flat = column([topic for value in values for topic in value or []], "text")
+        owners = np.repeat(np.arange(len(values)), lengths)
+        mask = np.zeros(len(values), dtype=bool)
+        mask[owners[flat == condition.lower()]] = True
+        return mask
+    return column(values, kind) == condition.lower()
+
+
+def offenders(items, qualifier):
+    # The (index, value) of every item that does not match the qualifier.
+    field, kind, condition = parse_qualifier(qualifier)
+    values = [field_value(item, field) for item in items]
+    if not values:
+        return []
+    mask = mask_for(values, kind, condition)
+    return [(int(index), values[index]) for index in np.flatnonzero(~mask)]
+
+
+def offenders_message(qualifier, failed, limit=50):
+    shown = ", ".join(f"[{index}] {value!r}" for index, value in failed[:limit])
+    more = f" and {len(failed) - limit} more" if len(failed) > limit else ""
+    return f"Items not matching '{qualifier}' ({len(failed)}): {shown}{more}"
@@ -0,0 +1,158 @@
+import json
+import re
+from urllib.parse import urlsplit
+
+import github_api_client
+
+# GraphQL batching of the follow-up lookups.
+# A user profile, its followers or its repositories are one REST request each. A batch gathers such lookups by their
+# REST URL and sends them as one GraphQL query, one aliased field per lookup, which costs one request and one GraphQL
+# rate limit point instead of one core request each. Each answer is mapped back to the shape of the REST response, so
+# the tests read it the same way. A lookup the query could not answer is fetched from its REST URL instead, by the
+# pipeline's workers. That includes the organizations, which GraphQL's user(login:) reports as NOT_FOUND.
+#
+# The issues of a repository stay REST requests: GET /repos/{owner}/{name}/issues also lists the pull requests, which
+# GraphQL's repository.issues leaves out, so the batched answer would not be the same list.
+
+# Nodes of a REST page (per_page default) and lookups of one query.
+PAGE_SIZE = 30
+MAX_LOOKUPS = 50
+
+LOOKUPS = [
+    (re.compile(r"^/users/([^/]+)$"), "user"),
+    (re.compile(r"^/users/([^/]+)/followers$"), "followers"),
+    (re.compile(r"^/users/([^/]+)/repos$"), "repos"),
+]
+
+USER_FIELDS = "__typename databaseId login name company location email bio url createdAt"
+REPOSITORY_FIELDS = ("databaseId name nameWithOwner description url isPrivate isArchived stargazerCount forkCount "
+                     "createdAt pushedAt primaryLanguage { name }")
+
+
+def quote(value):
+    return json.dumps(value)
+
+
+# kind -> (field of the query, path of the REST answer in the field's data)
+FIELDS = {
+    "user": (lambda login: f"user(login: {quote(login)}) {{ {USER_FIELDS} }}", ()),
+    "followers": (lambda login: f"user(login: {quote(login)}) {{ followers(first: {PAGE_SIZE}) "
+                                f"{{ nodes {{ {USER_FIELDS} }} }} }}", ("followers", "nodes")),
+    # GET /users/{login}/repos lists the public repositories owned by the user, by name.
+    "repos": (lambda login: f"user(login: {quote(login)}) {{ repositories(first: {PAGE_SIZE}, privacy: PUBLIC, "
+                            f"ownerAffiliations: [OWNER], orderBy: {{field: NAME, direction: ASC}}) "
+                            f"{{ nodes {{ {REPOSITORY_FIELDS} }} }} }}", ("repositories", "nodes")),
+}
+
+
+# The REST fields the GraphQL nodes can give, with the API URLs rebuilt so further follow-ups can use them.
+
+def rest_user(node, api):
+    url = f"{api}/users/{node['login']}"
+    return {
+        "login": node["login"], "id": node["databaseId"], "type": node["__typename"], "name": node["name"],
+        "company": node["company"], "location": node["location"], "email": node["email"], "bio": node["bio"],
+        "url": url, "html_url": node["url"], "followers_url": f"{url}/followers", "repos_url": f"{url}/repos",
+        "created_at": node["createdAt"],
+    }
+
+
+def rest_repository(node, api):
+    url = f"{api}/repos/{node['nameWithOwner']}"
+    return {
+        "id": node["databaseId"], "name": node["name"], "full_name": node["nameWithOwner"],
+        "owner": {"login": node["nameWithOwner"].split("/", 1)[0]}, "private": node["isPrivate"],
+        "url": url, "html_url": node["url"], "issues_url": f"{url}/issues{{/number}}",
+        "description": node["description"], "created_at": node["createdAt"], "pushed_at": node["pushedAt"],
+        "stargazers_count": node["stargazerCount"], "forks_count": node["forkCount"], "archived": node["isArchived"],
+        "language": (node["primaryLanguage"] or {}).get("name"),
+    }
+
+
+REST_SHAPES = {"user": rest_user, "followers": rest_user, "repos": rest_repository}
+
+
+def lookup(client, url):
+    # (kind, arguments) of a REST URL the batches can answer, or None.
+    url = urlsplit(client.url(url))
+    base = urlsplit(client.base_url)
+    if url.netloc != base.netloc or url.query or not url.path.startswith(base.path + "/"):
+        return None
+    path = url.path[len(base.path):]
+    for pattern, kind in LOOKUPS:
+        match = pattern.match(path)
+        if match:
+            return kind, match.groups()
+    return None
+
+
+class GraphqlBatch:
+
+    def __init__(self, client):
+        self.client = client
+        # (kind, arguments) -> [(url, future)]
+        self.lookups = {}
+
+    def __len__(self):
+        return len(self.lookups)
+
+    def add(self, url, future):
+        self.lookups.setdefault(lookup(self.client, url), []).append((url, future))
+        return future
+
+    def query(self):
+        # Aliases in a stable order, so the same lookups always make the same query (cassettes).
+        keys = sorted(self.lookups)
+        fields = " ".join(f"q{index}: {FIELDS[kind][0](*arguments)}" for index, (kind, arguments) in enumerate(keys))
+        return "query { " + fields + " }", keys
+
+    def send(self, fallback):
+        # fallback(url, future) fetches a lookup the query did not answer from its REST URL and resolves the future.
+        waiting = [(key, url, future) for key, entries in self.lookups.items() for url, future in entries
+                   if future.set_running_or_notify_cancel()]
+        try:
+            answers = self.answers()
+            unanswered = []
+            for key, url, future in waiting:
+                if key in answers:
+                    future.set_result(answers[key](url))
+                else:
+                    unanswered.append((url, future))
+            for url, future in unanswered:
+                fallback(url, future)
+        except Exception as exception:
+            for _, _, future in waiting:
+                if not future.done():
+                    future.set_exception(exception)
+
+    def answers(self):
+        # (kind, arguments) -> function building the REST response of a URL, for every lookup the query answered.
+        query, keys = self.query()
+        response = self.client.graphql(query)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code != 200 or not isinstance(payload.get("data"), dict):
+            return {}
+        headers = {name: value for name, value in response.headers.items() if name.startswith("X-RateLimit-")}
+        headers["Content-Type"] = "application/json; charset=utf-8"
+
+        def build(data):
+            body = json.dumps(data).encode()
+            return lambda url: github_api_client.build_response(response.request, 200, "OK", headers, body, url)
+
+        answers = {}
+        for index, key in enumerate(keys):
+            # A field without data is left to REST, NOT_FOUND included: user(login:) does not resolve the
+            # organizations, which the REST user endpoints answer.
+            data = payload["data"].get(f"q{index}")
+            if data is None:
+                continue
+            kind = key[0]
+            for name in FIELDS[kind][1]:
+                data = data[name]
+            shape = REST_SHAPES[kind]
+            api = self.client.base_url
+            answers[key] = build([shape(node, api) for node in data] if isinstance(data, list) else shape(data, api))
+        return answers
@@ -0,0 +1,135 @@
+import functools
+import html
+import threading
+import time
+
+import numpy as np
+
+import github_api_async
+
+# Latency budgets of the search tests.
+# A test decorated with @budget(p95=800) still runs as usual; when the budgets are enabled (--latency-budgets) its
+# search requests are then sent again, "warmup" times unmeasured and "calls" times measured, and the test fails if a
+# percentile is over its budget (in milliseconds). The measured requests skip the layers that answer without the
+# network (coalescing, cassettes, cache), and the time is taken from the transport, so pacing waits are not counted.
+# In the report-only mode (--latency-report) the percentiles are measured and reported the same way, but no test fails,
+# neither over its budget nor when a measured call does not get a 200.
+
+PERCENTILES = (50, 95, 99)
+
+settings = {"enabled": False, "calls": 5, "warmup": 1, "report_only": False}
+results = []
+_results_lock = threading.Lock()
+
+
+def configure(enabled, calls=None, warmup=None, report_only=False):
+    settings["enabled"] = enabled
+    settings["report_only"] = report_only
+    if calls:
+        settings["calls"] = calls
+    if warmup is not None:
+        settings["warmup"] = warmup
+    results.clear()
+
+
+class LatencyResult:
+
+    def __init__(self, test_id, params, samples, budgets):
+        self.test_id = test_id
+        self.params = params
+        self.samples = samples
+        self.budgets = budgets
+        self.percentiles = {percentile: float(np.percentile(samples, percentile)) for percentile in PERCENTILES}
+
+    @property
+    def broken(self):
+        # [(percentile, measured, budget)] of every percentile over its budget.
+        return [(percentile, self.percentiles[percentile], limit) for percentile, limit in self.budgets.items()
+                if self.percentiles[percentile] > limit]
+
+    def describe(self):
+        return ", ".join(f"p{percentile} {value:.0f} ms" for percentile, value in self.percentiles.items())
+
+
+def timed_search(client, kind, params, auth, text_match=False):
+    # Transport time of one search: requests' "elapsed" (until the headers) plus the download of the body.
+    response = client.search(kind, params, auth=auth, text_match=text_match, stream=True, uncached=True)
+    started = time.perf_counter()
+    try:
+        response.content
+    finally:
+        response.close()
+    return response.status_code, (response.elapsed.total_seconds() + time.perf_counter() - started) * 1000
+
+
+def measure(client, kind, params, auth=True, calls=None, warmup=None, text_match=False):
+    calls = calls or settings["calls"]
+    warmup = settings["warmup"] if warmup is None else warmup
+    samples = []
+    for index in range(warmup + calls):
+        status, duration = timed_search(client, kind, params, auth, text_match)
+        if status != 200:
+            raise AssertionError(f"Latency measurement of '{params}' got status {status}.")
+        if index >= warmup:
+            samples.append(duration)
+    return samples
+
+
+def budget(p50=None, p95=None, p99=None, calls=None, warmup=None):
+    # Declares the latency budget (milliseconds) of a search test, e.g. @budget(p95=800).
+    budgets = {percentile: limit for percentile, limit in zip(PERCENTILES, (p50, p95, p99)) if limit is not None}
+
+    def decorate(test):
+        @functools.wraps(test)
+        def wrapper(self):
+            test(self)
+            if settings["enabled"]:
+                check(self, test, budgets, calls, warmup)
+
+        wrapper.latency_budget = budgets
+        return wrapper
+
+    return decorate
+
+
+def check(test_case, test, budgets, calls=None, warmup=None):
+    failures = []
+    for params, auth, text_match in github_api_async.discover_searches(test):
+        try:
+            samples = measure(test_case.client, test_case.search_path, params, auth, calls, warmup, text_match)
+        except AssertionError:
+            if settings["report_only"]:
+                continue
+            raise
+        result = LatencyResult(test_case.id(), params, samples, budgets)
+        with _results_lock:
+            results.append(result)
+        for percentile, measured, limit in result.broken:
+            failures.append(f"p{percentile} of '{params}' is {measured:.0f} ms, over the {limit} ms budget "
+                            f"({len(samples)} calls: {result.describe()})")
+    if failures and not settings["report_only"]:
+        test_case.fail("\n".join(failures))
+
+
+def summary():
+    mode = " (report only)" if settings["report_only"] else ""
+    lines = [f"latency budgets{mode}: {len(results)} searches measured, "
+             f"{sum(1 for result in results if result.broken)} over budget"]
+    for result in results:
+        status = "over budget" if result.broken else "ok"
+        lines.append(f"  {result.test_id} '{result.params}': {result.describe()} ({status})")
+    return "\n".join(lines)
+
+
+def html_table():
+    # Percentile table of the pytest-html report.
+    rows = []
+    for result in results:
+        limits = ", ".join(f"p{percentile} < {limit} ms" for percentile, limit in result.budgets.items())
+        cells = [result.test_id.rsplit(".", 1)[-1], result.params, str(len(result.samples))]
+        cells += [f"{result.percentiles[percentile]:.0f}" for percentile in PERCENTILES]
+        cells += [f"{max(result.samples):.0f}", limits, "over budget" if result.broken else "ok"]
+        rows.append("<tr>" + "".join(f"<td>{html.escape(cell)}</td>" for cell in cells) + "</tr>")
+    header = "".join(f"<th>{name}</th>" for name in
+                     ["Test", "Query", "Calls", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)", "Budget", "Result"])
+    return f"<h2>Latency budgets</h2><table><tr>{header}</tr>{''.join(rows)}</table>"
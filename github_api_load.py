@@ -0,0 +1,220 @@
+import argparse
+import importlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import github_api_async
+import github_api_client
+
+# Open-loop load generator replaying the searches of the test modules.
+# Arrivals follow a Poisson process at the target rate for a fixed duration, whatever the server's response time:
+# a slow response never delays the next request. The latency of a request is measured from the time it was
+# scheduled to be sent, not from when a worker got to it, so queueing behind slow responses is counted
+# (no coordinated omission). The latencies go into HDR-style log-linear histograms.
+#
+#   python github_api_load.py --base-url http://127.0.0.1:8000 --rate 200 --duration 60 --weight stars=3
+
+TEST_MODULES = ["github_api_repo", "github_api_user", "github_api_code"]
+REPORTED_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    # Log-linear histogram of integer values (microseconds) with 2 significant digits, like HdrHistogram:
+    # the values below 256 have their own bucket, above that every power of two is split into 128 buckets.
+
+    SUB_BITS = 8
+    HALF = 1 << (SUB_BITS - 1)
+
+    def __init__(self, highest=3600 * 1000 * 1000):
+        self.counts = np.zeros(self.index(highest) + 1, dtype=np.int64)
+        self.highest = highest
+        self.total = 0
+        self.max = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def index(cls, value):
+        shift = max(0, value.bit_length() - cls.SUB_BITS)
+        return shift * cls.HALF + (value >> shift)
+
+    @classmethod
+    def highest_equivalent(cls, index):
+        if index < 2 * cls.HALF:
+            return index
+        shift = index // cls.HALF - 1
+        return ((index - shift * cls.HALF + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = min(max(0, int(seconds * 1_000_000)), self.highest)
+        with self.lock:
+            self.counts[self.index(value)] += 1
+            self.total += 1
+            self.max = max(self.max, value)
+
+    def percentile(self, percentile):
+        # Seconds, the highest value of the bucket holding the percentile.
+        if not self.total:
+            return 0.0
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, max(1, int(np.ceil(percentile / 100 * self.total)))))
+        return min(self.highest_equivalent(index), self.max) / 1_000_000
+
+    def describe(self):
+        values = ", ".join(f"p{percentile:g} {self.percentile(percentile) * 1000:.1f} ms"
+                           for percentile in REPORTED_PERCENTILES)
+        return f"{values}, max {self.max / 1000:.1f} ms"
+
+
+def discover_workload(module_names=TEST_MODULES):
+    # [(kind, params, auth, text_match)] of every literal make_request call of the test modules.
+    workload = []
+    for module_name in module_names:
+        module = importlib.import_module(module_name)
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if not issubclass(cls, github_api_client.GithubSearchTestCase) or cls.__module__ != module_name:
+                continue
+            for name, method in inspect.getmembers(cls, inspect.isfunction):
+                if name.startswith("test"):
+                    for params, auth, text_match in github_api_async.discover_searches(method):
+                        workload.append((cls.search_path, params, auth, text_match))
+    return list(dict.fromkeys(workload))
+
+
+def weights_for(workload, rules):
+    # "stars=3" gives the weight 3 to the searches containing "stars", the others keep 1.
+    weights = np.ones(len(workload))
+    for rule in rules:
+        pattern, _, weight = rule.rpartition("=")
+        for index, (_, params, *_) in enumerate(workload):
+            if pattern in params:
+                weights[index] = float(weight)
+    return weights / weights.sum()
+
+
+class LoadRun:
+
+    def __init__(self, client, workload, weights, rate, duration, concurrency=64, seed=None):
+        self.client = client
+        self.workload = workload
+        self.weights = weights
+        self.rate = rate
+        self.duration = duration
+        self.concurrency = concurrency
+        self.rng = np.random.default_rng(seed)
+
+        self.latency = Histogram()
+        self.service = Histogram()
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.elapsed = 0.0
+
+    def schedule(self):
+        # Poisson arrivals: exponential gaps between the requests, each with its search picked from the mix.
+        expected = int(self.rate * self.duration * 1.2) + 10
+        offsets = np.cumsum(self.rng.exponential(1 / self.rate, expected))
+        while offsets[-1] < self.duration:
+            offsets = np.concatenate((offsets, offsets[-1] + np.cumsum(self.rng.exponential(1 / self.rate, expected))))
+        offsets = offsets[offsets < self.duration]
+        return offsets, self.rng.choice(len(self.workload), len(offsets), p=self.weights)
+
+    def send(self, intended, query):
+        kind, params, auth, text_match = self.workload[query]
+        started = time.perf_counter()
+        try:
+            response = self.client.search(kind, params, auth=auth, text_match=text_match, stream=False)
+            status = response.status_code
+        except Exception as exception:
+            status = None
+            with self.lock:
+                self.errors[type(exception).__name__] += 1
+        finished = time.perf_counter()
+        self.latency.record(finished - intended)
+        self.service.record(finished - started)
+        with self.lock:
+            self.statuses[status] += 1
+
+    def run(self):
+        offsets, queries = self.schedule()
+        executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="github-load")
+        start = time.perf_counter()
+        for offset, query in zip(offsets, queries):
+            intended = start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(self.send, intended, int(query))
+            self.sent += 1
+        executor.shutdown(wait=True)
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    def report(self):
+        completed = sum(self.statuses.values())
+        failed = completed - self.statuses.get(200, 0)
+        return {
+            "sent": self.sent, "completed": completed, "elapsed": self.elapsed,
+            "throughput": completed / self.elapsed if self.elapsed else 0.0,
+            "error_rate": failed / completed if completed else 0.0,
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "errors": dict(self.errors),
+            "latency_ms": {f"p{percentile:g}": self.latency.percentile(percentile) * 1000
+                           for percentile in REPORTED_PERCENTILES},
+            "service_time_ms": {f"p{percentile:g}": self.service.percentile(percentile) * 1000
+                                for percentile in REPORTED_PERCENTILES},
+        }
+
+    def summary(self):
+        report = self.report()
+        return "\n".join([
+            f"{report['sent']} requests sent in {report['elapsed']:.1f}s (target {self.rate:g}/s), "
+            f"throughput {report['throughput']:.1f}/s, error rate {report['error_rate']:.2%}",
+            f"statuses: {report['statuses']}" + (f", errors: {report['errors']}" if report["errors"] else ""),
+            f"latency (from the scheduled time): {self.latency.describe()}",
+            f"service time (from the send):      {self.service.describe()}",
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test replaying the search tests' queries.")
+    parser.add_argument("--base-url", default=os.environ.get("GH_API_URL"),
+                        help="API to load, e.g. a local stand-in server or an internal proxy (also GH_API_URL).")
+    parser.add_argument("--rate", type=float, default=10.0, help="Target requests per second (default: 10).")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load (default: 30).")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="Maximum requests in flight; the others wait and their wait is counted (default: 64).")
+    parser.add_argument("--weight", action="append", default=[],
+                        help="SUBSTRING=WEIGHT for the searches containing SUBSTRING (default weight: 1).")
+    parser.add_argument("--module", action="append", dest="modules",
+                        help="Test module to take the searches from (default: the three search modules).")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Also write the report to this JSON file.")
+    options = parser.parse_args()
+
+    if not options.base_url:
+        parser.error("--base-url (or GH_API_URL) is required, the load is never sent to api.github.com by default.")
+
+    workload = discover_workload(options.modules or TEST_MODULES)
+    weights = weights_for(workload, options.weight)
+    client = github_api_client.GithubClient(base_url=options.base_url, pool_size=options.concurrency)
+    print(f"{len(workload)} searches in the mix, {options.rate:g} requests/s for {options.duration:g}s "
+          f"against {client.base_url}")
+
+    run = LoadRun(client, workload, weights, options.rate, options.duration, options.concurrency, options.seed).run()
+    print(run.summary())
+    if options.json:
+        with open(options.json, "w") as report_file:
+            json.dump(run.report(), report_file, indent=1)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import inspect
+import itertools
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import CancelledError, Future
+
+import github_api_async
+import github_api_client
+import github_api_graphql
+
+# Pipeline mode: the search of every test and the follow-up requests derived from it are run as chains across the
+# whole session. A test declares its follow-ups with @follow_ups, each one a function of the responses it depends on,
+# named by its parameters ("search" is the test's own search):
+#
+#   @github_api_pipeline.follow_ups(followers=lambda search: search.json()["items"][0]["followers_url"])
+#
+# The function returns the URL to fetch, or None to skip it. A follow-up is queued the moment its parents' responses
+# arrive, ahead of the searches still waiting so the started chains finish first, and the tests then only wait for
+# their own responses in make_request and fetch. Every request goes through the same workers (the concurrency) and
+# the same pacing (the rate in requests per second).
+#
+# With the GraphQL backend the follow-ups GraphQL can answer (see github_api_graphql) are gathered into one query,
+# sent once every chain's search has responded, or after the batch window, or when the batch is full. The lookups the
+# query could not answer go back to the queue as REST requests.
+
+ROOT = "search"
+
+stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def parents_of(derive):
+    return list(inspect.signature(derive).parameters)
+
+
+def follow_ups(**stages):
+    # Declares the follow-up stages of a search test, in any order as long as they form a DAG rooted at the search.
+    done = {ROOT}
+    waiting = dict(stages)
+    while waiting:
+        ready = [name for name, derive in waiting.items() if set(parents_of(derive)) <= done]
+        if not ready:
+            raise ValueError(f"Follow-ups with unknown parents or in a cycle: {', '.join(waiting)}")
+        for name in ready:
+            done.add(name)
+            del waiting[name]
+
+    def decorate(test):
+        test.follow_ups = stages
+        return test
+
+    return decorate
+
+
+def resolve(future, done):
+    # Settles a future with the outcome of another one.
+    if done.cancelled():
+        future.set_exception(CancelledError())
+    elif done.exception() is not None:
+        future.set_exception(done.exception())
+    else:
+        future.set_result(done.result())
+
+
+def count(name, value=1):
+    with _stats_lock:
+        stats[name] += value
+
+
+class Chain:
+    # The stages of one test: the futures of the stages already sent and the stages still waiting for their parents.
+
+    def __init__(self, pipeline, root, auth, stages, test=None):
+        self.pipeline = pipeline
+        self.auth = auth
+        self.test = test
+        self.futures = {ROOT: root}
+        self.depths = {ROOT: 0}
+        self.waiting = dict(stages)
+        self.lock = threading.Lock()
+        self.root_done = False
+        root.add_done_callback(self.advance)
+
+    def advance(self, _=None):
+        started = []
+        with self.lock:
+            first = not self.root_done
+            self.root_done = True
+            for name, derive in list(self.waiting.items()):
+                parents = parents_of(derive)
+                if not all(parent in self.futures and self.futures[parent].done() for parent in parents):
+                    continue
+                del self.waiting[name]
+                url = self.derive(derive, parents)
+                if url is None:
+                    # The test fetches it itself (or fails the same way), the stages below it are dropped.
+                    count("follow-ups skipped")
+                    continue
+                self.depths[name] = max(self.depths[parent] for parent in parents) + 1
+                self.futures[name] = self.pipeline.fetch(url, self.auth, self.depths[name], self.test)
+                started.append(self.futures[name])
+        # Outside of the lock: a future that is already done runs the callback right away.
+        for future in started:
+            future.add_done_callback(self.advance)
+        if first:
+            self.pipeline.root_finished()
+
+    def derive(self, derive, parents):
+        responses = {}
+        for parent in parents:
+            future = self.futures[parent]
+            if future.cancelled() or future.exception() is not None:
+                return None
+            responses[parent] = future.result()
+            if responses[parent].status_code != 200:
+                return None
+        try:
+            return derive(**responses)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+
+
+class Pipeline:
+
+    def __init__(self, client, concurrency=8, rate=None, graphql=False, graphql_window=1.0):
+        self.client = client
+        self.interval = 1 / rate if rate else 0.0
+        self.next_send = 0.0
+        self.pace_lock = threading.Lock()
+        # (-depth, sequence, future, send): the deepest stages first, then in the order they were queued.
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.workers = [threading.Thread(target=self.work, name=f"github-pipeline-{index}", daemon=True)
+                        for index in range(concurrency)]
+        for worker in self.workers:
+            worker.start()
+
+        # key -> [future, number of tests still waiting for it]; ("search", kind, params, auth, text_match) or
+        # ("GET", url, auth)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.started = time.perf_counter()
+
+        self.graphql = graphql
+        self.graphql_window = graphql_window
+        self.batch = None
+        self.batch_depth = 0
+        self.batch_timer = None
+        self.batch_lock = threading.Lock()
+        # Chains whose search has not responded yet, each of them may still add a lookup to the batch, plus one until
+        # every test is submitted.
+        self.roots_open = 1
+
+    def pace(self):
+        # Spaces the sends by the interval of the rate budget, whatever the worker.
+        if not self.interval:
+            return
+        with self.pace_lock:
+            now = time.perf_counter()
+            send_at = max(now, self.next_send)
+            self.next_send = send_at + self.interval
+        if send_at > now:
+            time.sleep(send_at - now)
+
+    def work(self):
+        while True:
+            _, _, future, send = self.queue.get()
+            if send is None:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            self.pace()
+            with self.lock:
+                self.in_flight += 1
+                in_flight = self.in_flight
+            with _stats_lock:
+                stats["max in flight"] = max(stats["max in flight"], in_flight)
+            try:
+                future.set_result(send())
+            except BaseException as exception:
+                future.set_exception(exception)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+
+    def register(self, key):
+        # (future of the request, whether it is new), the future is shared by every test waiting for the same one.
+        with self.lock:
+            if key in self.pending:
+                self.pending[key][1] += 1
+                return self.pending[key][0], False
+            future = Future()
+            self.pending[key] = [future, 1]
+        count("searches" if key[0] == ROOT else "follow-ups")
+        return future, True
+
+    def request(self, key, depth, send):
+        future, new = self.register(key)
+        if new:
+            self.queue.put((-depth, next(self.sequence), future, send))
+        return future
+
+    def submit(self, kind, params, auth=True, stages=None, text_match=False, test=None):
+        # test: node id of the test the chain is sent for, the first one when several tests send the same request.
+        root = self.request((ROOT, kind, params, auth, text_match), 0,
+                            lambda: github_api_client.send_for(test, self.client.search, kind, params, auth=auth,
+                                                               text_match=text_match))
+        if stages:
+            count("chains")
+            with self.batch_lock:
+                self.roots_open += 1
+            Chain(self, root, auth, stages, test)
+        return root
+
+    def fetch(self, url, auth, depth, test=None):
+        url = self.client.url(url)
+        key = ("GET", url, auth)
+        if self.graphql and auth and github_api_graphql.lookup(self.client, url):
+            future, new = self.register(key)
+            if new:
+                self.add_lookup(url, future, depth)
+            return future
+        return self.request(key, depth, lambda: github_api_client.send_for(test, self.client.get, url, auth))
+
+    def add_lookup(self, url, future, depth):
+        with self.batch_lock:
+            if self.batch is None:
+                self.batch = github_api_graphql.GraphqlBatch(self.client)
+                self.batch_timer = threading.Timer(self.graphql_window, self.flush)
+                self.batch_timer.daemon = True
+                self.batch_timer.start()
+            self.batch.add(url, future)
+            self.batch_depth = max(self.batch_depth, depth)
+            ready = len(self.batch) >= github_api_graphql.MAX_LOOKUPS or self.roots_open == 0
+        if ready:
+            self.flush()
+
+    def submitted(self):
+        self.root_finished()
+
+    def root_finished(self):
+        with self.batch_lock:
+            self.roots_open -= 1
+            ready = self.roots_open == 0
+        if ready:
+            self.flush()
+
+    def flush(self):
+        # Queues the batch as one request.
+        with self.batch_lock:
+            batch, self.batch = self.batch, None
+            if batch is None:
+                return
+            self.batch_timer.cancel()
+            depth, self.batch_depth = self.batch_depth, 0
+        count("graphql queries")
+        count("graphql lookups", len(batch))
+        # A query answers the lookups of several tests, it is charged to the session, and so are its fallbacks.
+        self.queue.put((-depth, next(self.sequence), Future(), lambda: github_api_client.send_for(
+            None, batch.send, lambda url, future: self.fall_back(url, future, depth))))
+
+    def fall_back(self, url, future, depth):
+        # Queues a lookup the batch could not answer as a REST request, so the fallbacks of a batch are sent by all
+        # the workers at the pace of the others. The batch has already set the lookup's future running.
+        rest = Future()
+        rest.add_done_callback(lambda done: resolve(future, done))
+        self.queue.put((-depth, next(self.sequence), rest,
+                        lambda: github_api_client.send_for(None, self.client.get, url)))
+
+    def take(self, key):
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                return None
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.pending[key]
+            return entry[0]
+
+    def close(self):
+        with self.batch_lock:
+            if self.batch_timer is not None:
+                self.batch_timer.cancel()
+            self.batch = None
+        with self.lock:
+            for future, _ in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+        for _ in self.workers:
+            self.queue.put((0, next(self.sequence), None, None))
+        for worker in self.workers:
+            worker.join()
+        count("elapsed ms", int((time.perf_counter() - self.started) * 1000))
+
+
+runner = None
+
+
+def start(client, concurrency=8, rate=None, graphql=False):
+    global runner
+    stop()
+    stats.clear()
+    runner = Pipeline(client, concurrency, rate, graphql)
+    return runner
+
+
+def stop():
+    global runner
+    if runner is not None:
+        runner.close()
+        runner = None
+
+
+def submit_test(test, kind, node_id=None):
+    # Queues the searches of a test method and, when it declares some, their follow-ups.
+    stages = getattr(test, "follow_ups", None)
+    for params, auth, text_match in github_api_async.discover_searches(test):
+        runner.submit(kind, params, auth, stages, text_match, node_id)
+
+
+def submitted():
+    runner.submitted()
+
+
+def take_search(kind, params, auth=True, text_match=False):
+    # Future of a search already sent by the pipeline, or None when the pipeline mode is off.
+    if runner is None:
+        return None
+    return runner.take((ROOT, kind, params, auth, text_match))
+
+
+def take_url(url, auth=True):
+    if runner is None:
+        return None
+    return runner.take(("GET", url, auth))
+
+
+def summary():
+    return (f"pipeline: {stats['chains']} chains, {stats['searches']} searches and {stats['follow-ups']} follow-ups "
+            f"sent in {stats['elapsed ms'] / 1000:.2f}s, {stats['follow-ups skipped']} follow-ups skipped, "
+            f"at most {stats['max in flight']} in flight"
+            + (f", {stats['graphql lookups']} follow-ups in {stats['graphql queries']} GraphQL queries"
+               if stats["graphql queries"] else ""))
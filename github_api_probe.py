@@ -0,0 +1,323 @@
+import argparse
+import gc
+import importlib
+import os
+import signal
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import github_api_client
+import github_api_ratelimit
+import github_api_timing
+import github_api_tokens
+
+# Synthetic monitoring of the search API with the test suites.
+# The daemon loads the test classes once and runs them every --interval seconds with the same shared client, so the
+# keep-alive connections stay warm between the rounds. A Prometheus endpoint (/metrics) exports the duration
+# histogram and the pass/fail counters of every test, the requests, the bytes sent and received, and the remaining
+# rate limit of every resource. Every metric is a fixed set of values (the tests, resources and statuses are
+# bounded, a histogram is one counter per bucket) and nothing else is kept between the rounds, so the memory stays
+# flat however long it runs.
+#
+#   python github_api_probe.py --base-url http://127.0.0.1:8000 --interval 60 --port 9108
+
+TEST_MODULES = ["github_api_repo", "github_api_user", "github_api_code"]
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value):
+    # Counters stay exact however large they grow.
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def resident_memory():
+    # Resident set size in bytes (Linux), or None.
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Metrics:
+    # Counters, gauges and histograms rendered in the Prometheus text format. A sample is keyed by its labels, a tuple
+    # of (name, value) pairs; a histogram sample is [count per bucket, sum, count].
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # name -> (type, help, {labels: value})
+        self.families = {}
+
+    def declare(self, name, kind, help_text):
+        self.families[name] = (kind, help_text, {})
+
+    def samples(self, name):
+        return self.families[name][2]
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            samples = self.samples(name)
+            samples[labels] = samples.get(labels, 0) + value
+
+    def set(self, name, labels=(), value=0):
+        with self.lock:
+            self.samples(name)[labels] = value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            samples = self.samples(name)
+            sample = samples.get(labels)
+            if sample is None:
+                sample = samples[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, samples) in self.families.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples.items():
+                    if kind != "histogram":
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', f'{bound:g}')])} {bucket_count}")
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                    lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def probe_metrics():
+    metrics = Metrics()
+    metrics.declare("github_probe_test_duration_seconds", "histogram", "Duration of the test runs.")
+    metrics.declare("github_probe_test_runs_total", "counter", "Test runs by result (pass, fail, error, skip).")
+    metrics.declare("github_probe_test_last_pass_timestamp_seconds", "gauge", "Time of the last passed run.")
+    metrics.declare("github_probe_requests_total", "counter", "Requests sent by rate limit resource and status.")
+    metrics.declare("github_probe_sent_bytes_total", "counter", "Bytes of the requests (headers and body).")
+    metrics.declare("github_probe_received_bytes_total", "counter",
+                    "Bytes of the responses as transferred (status line, headers and compressed body).")
+    metrics.declare("github_probe_rate_limit_remaining", "gauge",
+                    "Requests left in the current rate limit window, by resource and token.")
+    metrics.declare("github_probe_rounds_total", "counter", "Rounds of the test suites run.")
+    metrics.declare("github_probe_round_duration_seconds", "gauge", "Duration of the last round.")
+    metrics.declare("github_probe_resident_memory_bytes", "gauge", "Resident memory of the probe.")
+    return metrics
+
+
+class RequestMetrics:
+    # Layer next to the transport: counts every request that reaches the network with its bytes and the rate limit
+    # left, as told by the response headers.
+    order = 75
+
+    def __init__(self, metrics, raw_url=None):
+        self.metrics = metrics
+        self.raw_root = github_api_ratelimit.raw_root(raw_url)
+
+    def __call__(self, request, send, **kwargs):
+        response = send(request, **kwargs)
+        headers = response.headers
+        resource = headers.get("X-RateLimit-Resource") or github_api_ratelimit.resource_of(request.url, self.raw_root)
+        labels = (("resource", resource),)
+        self.metrics.inc("github_probe_requests_total", labels + (("status", str(response.status_code)),))
+        self.metrics.inc("github_probe_sent_bytes_total", labels,
+                         len(f"{request.method} {request.path_url} HTTP/1.1\r\n") +
+                         github_api_timing.header_bytes(request.headers) + len(request.body or b""))
+        if "X-RateLimit-Remaining" in headers:
+            token = github_api_client.token_id(request)
+            self.metrics.set("github_probe_rate_limit_remaining", labels + (("token", token),),
+                             int(headers["X-RateLimit-Remaining"]))
+
+        def received():
+            # The body is downloaded by the time the response is closed (or read, without streaming).
+            self.metrics.inc("github_probe_received_bytes_total", labels,
+                             response.raw.tell() + github_api_timing.header_bytes(headers) +
+                             len(f"HTTP/1.1 {response.status_code} {response.reason}\r\n"))
+
+        if not kwargs.get("stream", False):
+            received()
+        else:
+            close = response.close
+
+            def counted_close():
+                response.close = close
+                received()
+                close()
+
+            response.close = counted_close
+        return response
+
+
+def load_tests(module_names=TEST_MODULES, match=None):
+    # The test cases of the modules, loaded once. They are run one by one: a suite drops its tests once run.
+    tests = []
+    pending = [unittest.defaultTestLoader.loadTestsFromModule(importlib.import_module(name)) for name in module_names]
+    while pending:
+        test = pending.pop(0)
+        if isinstance(test, unittest.TestSuite):
+            pending[:0] = list(test)
+        elif not match or any(pattern in test.id() for pattern in match):
+            tests.append(test)
+    return tests
+
+
+class Probe:
+
+    def __init__(self, tests, metrics, interval):
+        self.tests = tests
+        self.metrics = metrics
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run_test(self, test):
+        result = unittest.TestResult()
+        started = time.perf_counter()
+        test.run(result)
+        duration = time.perf_counter() - started
+        if result.errors:
+            outcome, details = "error", result.errors
+        elif result.failures:
+            outcome, details = "fail", result.failures
+        else:
+            outcome, details = ("skip" if result.skipped else "pass"), []
+        labels = (("test", test.id()),)
+        self.metrics.observe("github_probe_test_duration_seconds", labels, duration)
+        self.metrics.inc("github_probe_test_runs_total", labels + (("result", outcome),))
+        if outcome == "pass":
+            self.metrics.set("github_probe_test_last_pass_timestamp_seconds", labels, time.time())
+        for _, traceback in details:
+            # The last line of the traceback is the assertion or the exception.
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {test.id()} {outcome}: "
+                  f"{traceback.strip().splitlines()[-1]}", flush=True)
+        return outcome
+
+    def run_round(self):
+        started = time.perf_counter()
+        outcomes = {}
+        for test in self.tests:
+            if self.stopping.is_set():
+                break
+            outcome = self.run_test(test)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        duration = time.perf_counter() - started
+        self.metrics.inc("github_probe_rounds_total")
+        self.metrics.set("github_probe_round_duration_seconds", value=duration)
+        # The responses closed over by the layers are cycles, they are freed now rather than piling up.
+        gc.collect()
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} round of {len(self.tests)} tests in {duration:.2f}s: "
+              + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())), flush=True)
+
+    def run(self, rounds=0):
+        # Rounds start every interval; a round longer than the interval delays the next one instead of overlapping.
+        done = 0
+        next_round = time.monotonic()
+        while not self.stopping.is_set() and (not rounds or done < rounds):
+            self.run_round()
+            done += 1
+            next_round = max(next_round + self.interval, time.monotonic())
+            if not rounds or done < rounds:
+                self.stopping.wait(next_round - time.monotonic())
+
+    def stop(self, *_):
+        self.stopping.set()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        metrics = self.server.metrics
+        memory = resident_memory()
+        if memory is not None:
+            metrics.set("github_probe_resident_memory_bytes", value=memory)
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not logged.
+        pass
+
+
+def serve_metrics(metrics, host, port):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="github-probe-metrics", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the search test suites on a schedule and export Prometheus "
+                                                 "metrics of the results.")
+    parser.add_argument("--base-url", default=os.environ.get("GH_API_URL"),
+                        help="API to probe, e.g. a local stand-in server (default: GH_API_URL or api.github.com).")
+    parser.add_argument("--raw-url", default=os.environ.get("GH_RAW_URL"),
+                        help="Host of the raw files (default: GH_RAW_URL or raw.githubusercontent.com).")
+    parser.add_argument("--interval", type=float, default=300.0,
+                        help="Seconds between the starts of two rounds (default: 300).")
+    parser.add_argument("--rounds", type=int, default=0, help="Stop after this many rounds (default: never).")
+    parser.add_argument("--host", default="127.0.0.1", help="Address of the metrics endpoint (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=9108, help="Port of the metrics endpoint (default: 9108).")
+    parser.add_argument("--module", action="append", dest="modules",
+                        help="Test module to run (default: the three search modules).")
+    parser.add_argument("--match", action="append",
+                        help="Only run the tests whose id contains this substring (repeatable).")
+    parser.add_argument("--rate-limit", action="store_true", default=bool(os.environ.get("GH_RATE_LIMIT")),
+                        help="Pace the requests with the shared token buckets, see github_api_ratelimit.")
+    options = parser.parse_args()
+
+    # The tests use the shared client: it is set up once and keeps its connections for the whole run.
+    client = github_api_client.reset_client(base_url=options.base_url, raw_url=options.raw_url)
+    metrics = probe_metrics()
+    # As in conftest: with a pool, the limiter hands the rate limit responses up so another token is tried.
+    pool = len(client.tokens) > 1
+    limiter = None
+    if options.rate_limit:
+        limiter = client.use(github_api_ratelimit.RateLimiter(raw_url=client.raw_url, retry_rate_limited=not pool))
+    if pool:
+        client.use(github_api_tokens.TokenPool(client.tokens, client.raw_url, limiter))
+    client.use(RequestMetrics(metrics, client.raw_url))
+
+    tests = load_tests(options.modules or TEST_MODULES, options.match)
+    server = serve_metrics(metrics, options.host, options.port)
+    probe = Probe(tests, metrics, options.interval)
+    signal.signal(signal.SIGTERM, probe.stop)
+    signal.signal(signal.SIGINT, probe.stop)
+    print(f"probing {client.base_url} with {len(tests)} tests every {options.interval:g}s, "
+          f"metrics on http://{options.host}:{server.server_port}/metrics", flush=True)
+    try:
+        probe.run(options.rounds)
+    finally:
+        server.shutdown()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import github_api_client
+
+# Token bucket pacing for the shared client.
+# Every (resource, token) pair has its own bucket: "search", "code_search", "core" and "raw" have different budgets
+# on GitHub, and every token (or the anonymous IP) has its own quota. The buckets live in a JSON file guarded by
+# a file lock, so all the pytest-xdist workers on a runner draw from the same budget.
+# A rate limit response blocks its bucket until the reset (or Retry-After) and is sent again once it is over, unless
+# a token pool is installed: the pool then sends the request with another token instead (see github_api_tokens).
+
+# Requests allowed per window (seconds) before the first response tells us the real limit.
+BUDGETS = {
+    "search": (30, 60),
+    "code_search": (10, 60),
+    "core": (5000, 3600),
+    "graphql": (5000, 3600),
+    # raw.githubusercontent.com has no documented limit, this only keeps the bursts reasonable.
+    "raw": (5000, 60),
+}
+
+# Unauthenticated requests have much smaller budgets.
+ANONYMOUS_BUDGETS = {
+    "search": (10, 60),
+    "code_search": (10, 60),
+    "core": (60, 3600),
+}
+
+RATE_LIMITED_STATUS = (403, 429)
+MAX_RETRIES = 3
+
+
+def rate_limited(response):
+    # A primary or secondary rate limit response, as opposed to a plain 403 Forbidden.
+    return response.status_code in RATE_LIMITED_STATUS and (
+        "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0")
+
+
+def raw_root(raw_url=None):
+    # Host and path of the raw files: "raw.githubusercontent.com", or e.g. "127.0.0.1:8000/raw" for a stand-in server
+    # that serves them next to the API.
+    if not raw_url:
+        return "raw.githubusercontent.com"
+    url = urlsplit(raw_url)
+    return url.netloc + url.path.rstrip("/")
+
+
+def resource_of(url, raw_root):
+    # Rate limit resource of a request URL, as in GitHub's X-RateLimit-Resource header.
+    url = urlsplit(url)
+    if (url.netloc + url.path).startswith(raw_root + "/"):
+        return "raw"
+    if url.path.startswith("/search/code"):
+        return "code_search"
+    if url.path.startswith("/search/"):
+        return "search"
+    if url.path.startswith("/graphql"):
+        return "graphql"
+    return "core"
+
+
+def bucket_key(resource, token):
+    # token: the token_id of the request ("anon" without a token).
+    return f"{resource}:{token}"
+
+
+def default_state_path():
+    return os.path.join(tempfile.gettempdir(), "github_api_ratelimit.json")
+
+
+class RateLimiter:
+    order = 50
+
+    def __init__(self, state_path=None, raw_url=None, budgets=None, retry_rate_limited=True):
+        self.state_path = state_path or default_state_path()
+        # False hands the rate limit responses up to the token pool, which tries another token first.
+        self.retry_rate_limited = retry_rate_limited
+        self.lock_path = self.state_path + ".lock"
+        self.raw_root = raw_root(raw_url)
+        self.budgets = dict(BUDGETS, **(budgets or {}))
+        self.thread_lock = threading.Lock()
+
+        self.requests = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.retries = 0
+
+    def resource(self, request):
+        return resource_of(request.url, self.raw_root)
+
+    def new_bucket(self, resource, anonymous):
+        limit, window = self.budgets[resource]
+        if anonymous and resource in ANONYMOUS_BUDGETS:
+            limit, window = ANONYMOUS_BUDGETS[resource]
+        return {"tokens": float(limit), "limit": limit, "window": window, "updated": time.time(),
+                "remaining": None, "reset": 0, "blocked_until": 0}
+
+    @contextmanager
+    def buckets(self):
+        # Threads of this process are serialized by the thread lock, other processes by the file lock.
+        with self.thread_lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path) as state_file:
+                        state = json.load(state_file)
+                except (FileNotFoundError, ValueError):
+                    state = {}
+                yield state
+                temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+                with open(temp_path, "w") as state_file:
+                    json.dump(state, state_file)
+                os.replace(temp_path, self.state_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def acquire(self, key, resource, anonymous):
+        waited = 0.0
+        while True:
+            with self.buckets() as state:
+                bucket = state.setdefault(key, self.new_bucket(resource, anonymous))
+                now = time.time()
+                refill = (now - bucket["updated"]) * bucket["limit"] / bucket["window"]
+                bucket["tokens"] = min(float(bucket["limit"]), bucket["tokens"] + refill)
+                bucket["updated"] = now
+                if bucket["remaining"] is not None and now >= bucket["reset"]:
+                    # GitHub's window is over: the whole budget is available again.
+                    bucket["tokens"] = float(bucket["limit"])
+                    bucket["remaining"] = None
+
+                if bucket["blocked_until"] > now:
+                    wait = bucket["blocked_until"] - now
+                elif bucket["remaining"] is not None and bucket["remaining"] <= 0 and bucket["reset"] > now:
+                    wait = bucket["reset"] - now + 1
+                elif bucket["tokens"] >= 1:
+                    bucket["tokens"] -= 1
+                    if bucket["remaining"] is not None and bucket["reset"] > now:
+                        # Reserve the request so other workers see it before its response arrives.
+                        bucket["remaining"] -= 1
+                    wait = 0
+                else:
+                    wait = (1 - bucket["tokens"]) * bucket["window"] / bucket["limit"]
+
+            if not wait:
+                break
+            waited += wait
+            time.sleep(wait)
+
+        with self.thread_lock:
+            self.requests += 1
+            if waited:
+                self.waits += 1
+                self.waited += waited
+
+    def blocked_for(self, key):
+        # Seconds until the bucket of a key can send again after a rate limit response or an exhausted quota, 0 when
+        # it can now. Read without the lock: the state file is replaced atomically.
+        try:
+            with open(self.state_path) as state_file:
+                bucket = json.load(state_file).get(key)
+        except (FileNotFoundError, ValueError):
+            return 0.0
+        if bucket is None:
+            return 0.0
+        now = time.time()
+        wait = bucket["blocked_until"] - now
+        if bucket["remaining"] is not None and bucket["remaining"] <= 0:
+            wait = max(wait, bucket["reset"] - now + 1)
+        return max(0.0, wait)
+
+    def update(self, key, resource, anonymous, response):
+        headers = response.headers
+        limited = rate_limited(response)
+
+        with self.buckets() as state:
+            bucket = state.setdefault(key, self.new_bucket(resource, anonymous))
+            if "X-RateLimit-Limit" in headers:
+                bucket["limit"] = max(1, int(headers["X-RateLimit-Limit"]))
+            if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+                remaining = int(headers["X-RateLimit-Remaining"])
+                reset = int(headers["X-RateLimit-Reset"])
+                # Responses of concurrent requests arrive out of order, within a window the lowest count wins.
+                if reset == bucket["reset"] and bucket["remaining"] is not None:
+                    remaining = min(remaining, bucket["remaining"])
+                bucket["remaining"] = remaining
+                bucket["reset"] = reset
+                bucket["tokens"] = min(bucket["tokens"], float(remaining))
+            if limited:
+                retry_after = headers.get("Retry-After")
+                if retry_after:
+                    bucket["blocked_until"] = time.time() + int(retry_after)
+                else:
+                    bucket["blocked_until"] = bucket["reset"]
+        return limited
+
+    def __call__(self, request, send, **kwargs):
+        resource = self.resource(request)
+        token = github_api_client.token_id(request)
+        anonymous = token == "anon"
+        key = bucket_key(resource, token)
+
+        for attempt in range(MAX_RETRIES + 1):
+            self.acquire(key, resource, anonymous)
+            response = send(request, **kwargs)
+            if not self.update(key, resource, anonymous, response) or attempt == MAX_RETRIES \
+                    or not self.retry_rate_limited:
+                return response
+            # A secondary rate limit: wait for the time GitHub asked for and send the request again.
+            response.close()
+            with self.thread_lock:
+                self.retries += 1
+
+    def summary(self):
+        return (f"rate limiter: {self.requests} requests, {self.waits} paced for {self.waited:.1f}s in total, "
+                f"{self.retries} retried after a rate limit response")
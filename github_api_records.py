@@ -0,0 +1,220 @@
+import json
+
+import github_api_stream
+
+try:
+    import orjson
+except ImportError:
+    # The standard library decoder gives the same result, only slower.
+    orjson = None
+
+# Compact typed records of the search items.
+# A search page is hundreds of nested dicts, while the tests only read a dozen fields. A record keeps only those
+# fields, typed and flattened in __slots__ (e.g. "owner.login" becomes owner_login), and the decoded dicts are dropped
+# as soon as the record is built. Pages are decoded from the response bytes with orjson when it is installed.
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def as_tuple(value):
+    return tuple(value or ())
+
+
+class Fragment:
+    # One entry of "text_matches" (application/vnd.github.text-match+json): the property of the item it comes from
+    # ("name", "description", "content", ...), the fragment of its text, and the matches as (text, start, end) with
+    # the indices in the fragment.
+    __slots__ = ("object_type", "property", "fragment", "matches")
+
+    def __init__(self, object_type, prop, fragment, matches):
+        self.object_type = object_type
+        self.property = prop
+        self.fragment = fragment
+        self.matches = matches
+
+    @classmethod
+    def from_match(cls, match):
+        return cls(match.get("object_type"), match.get("property"), match.get("fragment") or "",
+                   tuple((entry["text"], *entry["indices"]) for entry in match.get("matches") or ()))
+
+    def terms(self):
+        # The matched words, lowercase, checked against the fragment itself.
+        return {text.lower() for text, start, end in self.matches if self.fragment[start:end].lower() == text.lower()}
+
+    def __eq__(self, other):
+        return type(other) is Fragment and all(getattr(self, name) == getattr(other, name)
+                                               for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Fragment({self.property!r}, {self.fragment!r}, {self.matches!r})"
+
+
+def text_matches(value):
+    # None when the search did not ask for text matches, so a missing entry is told from an empty one.
+    return tuple(Fragment.from_match(match) for match in value)
+
+
+class TextMatchIndex:
+    # The text matches of a list of items (records or dicts), indexed by (property, matched word) -> positions of the
+    # items, so a term is checked against every item at once from the search response.
+
+    def __init__(self, items):
+        self.size = 0
+        self.fragments = []
+        self.positions = {}
+        for position, item in enumerate(items):
+            if isinstance(item, Record):
+                fragments = item.text_matches
+            else:
+                value = item.get("text_matches")
+                fragments = None if value is None else text_matches(value)
+            self.fragments.append(fragments)
+            self.size += 1
+            for fragment in fragments or ():
+                for term in fragment.terms():
+                    self.positions.setdefault((fragment.property, term), set()).add(position)
+
+    def matching(self, term, properties=None):
+        # Positions of the items with a match of the term in one of the properties (any property when None).
+        term = term.lower()
+        if properties is not None:
+            properties = {properties} if isinstance(properties, str) else set(properties)
+        return set().union(*(positions for (prop, word), positions in self.positions.items()
+                             if word == term and (properties is None or prop in properties)))
+
+    def missing(self, term, properties=None):
+        # Positions of the items without such a match, in order.
+        matching = self.matching(term, properties)
+        return [position for position in range(self.size) if position not in matching]
+
+    def requested(self):
+        # Whether the response has text matches at all (the media type was asked for).
+        return any(fragments is not None for fragments in self.fragments)
+
+
+def compile_decoder(record_class):
+    # Generates from_item() for the fields of a record class, like namedtuple and dataclasses generate their methods:
+    # one straight function with a local per nested object is several times faster than a generic loop over paths.
+    lines = ["def from_item(item):", "    record = new(cls)"]
+    parents = {}
+    for attribute, (path, kind) in record_class.FIELDS.items():
+        *parts, key = path.split(".")
+        source = "item"
+        for depth in range(len(parts)):
+            # "license" is null for some repositories: a missing parent reads as an empty dict.
+            name = "_" + "_".join(parts[:depth + 1])
+            if name not in parents:
+                parents[name] = True
+                lines.append(f"    {name} = {source}.get({parts[depth]!r})")
+                lines.append(f"    {name} = {name} if {name}.__class__ is dict else EMPTY")
+            source = name
+        lines.append(f"    value = {source}.get({key!r})")
+        if kind is as_tuple:
+            lines.append(f"    record.{attribute} = tuple(value or ())")
+        else:
+            # JSON already gives the right type, the conversion is only for the unexpected values.
+            lines.append(f"    record.{attribute} = value if value is None or value.__class__ is {kind.__name__} "
+                         f"else {kind.__name__}(value)")
+    lines.append("    return record")
+    namespace = {"new": object.__new__, "cls": record_class, "EMPTY": {}, "tuple": tuple, "int": int, "str": str,
+                 "bool": bool, "text_matches": text_matches}
+    exec("\n".join(lines), namespace)
+    return namespace["from_item"]
+
+
+class Record:
+    __slots__ = ()
+    # attribute -> (dotted path in the API item, type)
+    FIELDS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        # Every subclass declares __slots__ = tuple(FIELDS), slots can only be set in the class body.
+        super().__init_subclass__(**kwargs)
+        cls.paths = {path: attribute for attribute, (path, _) in cls.FIELDS.items()}
+        cls.fields = list(cls.paths)
+        cls.from_item = staticmethod(compile_decoder(cls))
+
+    def value(self, path):
+        # Value of a dotted API path ("owner.login") or of an attribute ("owner_login").
+        return getattr(self, self.paths.get(path, path))
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, name) == getattr(other, name)
+                                                 for name in self.__slots__)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+class Repository(Record):
+    FIELDS = {
+        "id": ("id", int),
+        "name": ("name", str),
+        "full_name": ("full_name", str),
+        "owner_login": ("owner.login", str),
+        "description": ("description", str),
+        "size": ("size", int),
+        "stargazers_count": ("stargazers_count", int),
+        "watchers_count": ("watchers_count", int),
+        "forks_count": ("forks_count", int),
+        "created_at": ("created_at", str),
+        "pushed_at": ("pushed_at", str),
+        "language": ("language", str),
+        "topics": ("topics", as_tuple),
+        "license_key": ("license.key", str),
+        "archived": ("archived", bool),
+        "mirror_url": ("mirror_url", str),
+        "text_matches": ("text_matches", text_matches),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class User(Record):
+    FIELDS = {
+        "id": ("id", int),
+        "login": ("login", str),
+        "type": ("type", str),
+        "url": ("url", str),
+        "html_url": ("html_url", str),
+        "followers_url": ("followers_url", str),
+        "repos_url": ("repos_url", str),
+        "text_matches": ("text_matches", text_matches),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+class CodeResult(Record):
+    FIELDS = {
+        "name": ("name", str),
+        "path": ("path", str),
+        "sha": ("sha", str),
+        "url": ("url", str),
+        "html_url": ("html_url", str),
+        "repository_full_name": ("repository.full_name", str),
+        "repository_description": ("repository.description", str),
+        "repository_url": ("repository.url", str),
+        "text_matches": ("text_matches", text_matches),
+    }
+    __slots__ = tuple(FIELDS)
+
+
+# Record of each search endpoint.
+RECORDS = {"repositories": Repository, "users": User, "code": CodeResult}
+
+
+def decode_page(body, record):
+    # (meta, [records]) of a whole search page: the values other than "items" and the items as records.
+    data = loads(body)
+    items = data.pop("items", None) or []
+    return data, [record.from_item(item) for item in items]
+
+
+def stream_records(response, record):
+    # Records decoded while the response is downloaded, see github_api_stream.ItemStream.
+    for item in github_api_stream.ItemStream.from_response(response, record.fields):
+        yield record.from_item(item)
@@ -0,0 +1,254 @@
+import html
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+
+import github_api_ratelimit
+
+# Hedged requests and adaptive retries of the search endpoints.
+# The layer keeps the recent latencies (until the response headers) of every search endpoint. When a request is
+# still waiting past the hedge percentile (p95) of its endpoint, the same request is sent again and the first
+# response wins. Requests wait at most a few times the p99 for their headers (adaptive read timeout). Connection
+# errors, timeouts, 5xx and 202 responses, and 200 responses with "incomplete_results": true are retried with
+# full-jitter exponential backoff. A rate limit response is returned as it is: waiting for the budget is the rate
+# limiter's job.
+#
+# The layer runs above the rate limiter, so every attempt, hedges and retries included, takes a token and is paced.
+# Its Transport layer runs below the limiter and marks when an attempt leaves it: the hedge delay counts from there,
+# an attempt abandoned before it gets there is never sent, and the latencies are those of the transport
+# (response.elapsed), without the pacing waits. A losing response is closed as soon as it arrives, without
+# downloading its body.
+
+SEARCH_PATH = "/search/"
+# Latencies kept per endpoint and needed before hedging or shortening the timeout.
+WINDOW = 200
+MIN_SAMPLES = 20
+TIMEOUT_FACTOR = 4
+MIN_READ_TIMEOUT = 5.0
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+RETRY_STATUS = (202, 500, 502, 503, 504)
+INCOMPLETE = re.compile(rb'"incomplete_results"\s*:\s*true')
+
+
+def endpoint_of(request):
+    return urlsplit(request.url).path
+
+
+class Abandoned(Exception):
+    pass
+
+
+class Attempt:
+    # One send of a search: "sent" once it leaves the rate limiter (or fails before), "abandoned" once the race was
+    # decided without it.
+
+    def __init__(self):
+        self.sent = threading.Event()
+        self.abandoned = False
+        self.response = None
+        # When the hedge won against this attempt, to count the seconds it saved.
+        self.hedge_won_at = None
+
+
+class Transport:
+    # The part of the layer below the rate limiter, see Resilience.transport.
+    order = 60
+
+    def __init__(self, resilience):
+        self.resilience = resilience
+
+    def __call__(self, request, send, **kwargs):
+        attempt = getattr(self.resilience.local, "attempt", None)
+        if attempt is not None:
+            if attempt.abandoned:
+                # Its rate limit token is spent, the request is not.
+                self.resilience.count("abandoned before sending")
+                raise Abandoned()
+            attempt.sent.set()
+        return send(request, **kwargs)
+
+
+class Resilience:
+    # Installed together with its transport layer: client.use(resilience), client.use(resilience.transport).
+    order = 48
+
+    def __init__(self, hedge_percentile=95, max_attempts=MAX_ATTEMPTS, workers=32):
+        self.hedge_percentile = hedge_percentile
+        self.max_attempts = max_attempts
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="github-hedge")
+        self.latencies = defaultdict(lambda: deque(maxlen=WINDOW))
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        # Seconds the winning hedges saved over the requests they replaced, once those responded.
+        self.saved = 0.0
+        # Its own generator: the tests seed the global one to pick the same repositories on replay.
+        self.random = random.Random()
+        # The attempt the current thread is sending, for the transport layer.
+        self.local = threading.local()
+        self.transport = Transport(self)
+
+    def percentile(self, endpoint, percentile):
+        with self.lock:
+            samples = sorted(self.latencies[endpoint])
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[max(0, math.ceil(percentile / 100 * len(samples)) - 1)]
+
+    def read_timeout(self, endpoint, timeout):
+        p99 = self.percentile(endpoint, 99)
+        if p99 is None:
+            return timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        adaptive = max(MIN_READ_TIMEOUT, TIMEOUT_FACTOR * p99)
+        return connect, adaptive if read is None else min(read, adaptive)
+
+    def attempt(self, request, send, endpoint, kwargs, attempt):
+        self.local.attempt = attempt
+        try:
+            response = send(request, **kwargs)
+        finally:
+            self.local.attempt = None
+            attempt.sent.set()
+        with self.lock:
+            self.latencies[endpoint].append(response.elapsed.total_seconds())
+            attempt.response = response
+            abandoned = attempt.abandoned
+        if abandoned:
+            self.discard(response, attempt)
+        return response
+
+    def race(self, request, send, endpoint, kwargs):
+        # One attempt, hedged when it is slower than the hedge percentile of its endpoint.
+        first = Attempt()
+        primary = self.executor.submit(self.attempt, request, send, endpoint, kwargs, first)
+        delay = self.percentile(endpoint, self.hedge_percentile)
+        if delay is None:
+            return primary.result()
+        # The wait for a rate limit token is not latency, the hedge delay starts once the primary is sent.
+        first.sent.wait()
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+
+        second = Attempt()
+        hedge = self.executor.submit(self.attempt, request.copy(), send, endpoint, kwargs, second)
+        self.count("hedged")
+        done = wait([primary, hedge], return_when=FIRST_COMPLETED).done
+        winner, loser = (primary, hedge) if primary in done else (hedge, primary)
+        if winner.exception() is not None:
+            # The other one may still succeed.
+            return loser.result()
+        if winner is hedge:
+            self.count("hedges won")
+        self.abandon(first if loser is primary else second, winner is hedge)
+        return winner.result()
+
+    def abandon(self, attempt, hedge_won):
+        # The loser is not sent if it is still waiting for the rate limiter, its response is closed if it already
+        # arrived, otherwise attempt() closes it on arrival.
+        with self.lock:
+            attempt.abandoned = True
+            if hedge_won:
+                attempt.hedge_won_at = time.perf_counter()
+            response = attempt.response
+        if response is not None:
+            self.discard(response, attempt)
+
+    def discard(self, response, attempt):
+        response.close()
+        if attempt.hedge_won_at is not None:
+            with self.lock:
+                self.saved += time.perf_counter() - attempt.hedge_won_at
+
+    def retry_reason(self, response, stream):
+        if response.status_code in RETRY_STATUS:
+            return str(response.status_code)
+        # The flag comes before the items. The body is read only when the caller reads it whole anyway: a streamed
+        # response is parsed while it downloads and is not retried for incomplete results.
+        if response.status_code == 200 and not stream and INCOMPLETE.search(response.content[:512]):
+            return "incomplete results"
+        return None
+
+    def backoff(self, attempt, retry_after=None):
+        delay = self.random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(BACKOFF_CAP, int(retry_after)))
+        time.sleep(delay)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def __call__(self, request, send, **kwargs):
+        if request.method != "GET" or SEARCH_PATH not in endpoint_of(request):
+            return send(request, **kwargs)
+
+        endpoint = endpoint_of(request)
+        stream = kwargs.get("stream", False)
+        # The race is on the headers, the loser's body is never downloaded.
+        kwargs["stream"] = True
+        kwargs["timeout"] = self.read_timeout(endpoint, kwargs.get("timeout"))
+        self.count("requests")
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.race(request, send, endpoint, kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                if attempt == self.max_attempts:
+                    raise
+                self.count("retries")
+                self.count("retry: timeout" if isinstance(exception, requests.Timeout) else "retry: error")
+                self.backoff(attempt)
+                continue
+            if github_api_ratelimit.rate_limited(response):
+                self.count("stopped on a rate limit")
+                break
+            reason = self.retry_reason(response, stream)
+            if reason is None or attempt == self.max_attempts:
+                break
+            self.count("retries")
+            self.count(f"retry: {reason}")
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+            self.backoff(attempt, retry_after)
+        if not stream:
+            # As without streaming: the body is read and the connection goes back to the pool.
+            response.content
+            response.close()
+        return response
+
+    def hedge_delays(self):
+        with self.lock:
+            endpoints = list(self.latencies)
+        return {endpoint: self.percentile(endpoint, self.hedge_percentile) for endpoint in endpoints}
+
+    def summary(self):
+        counters = self.counters
+        reasons = ", ".join(f"{name[7:]} {count}" for name, count in sorted(counters.items())
+                            if name.startswith("retry: "))
+        delays = ", ".join(f"{endpoint} {delay * 1000:.0f} ms" for endpoint, delay in self.hedge_delays().items()
+                           if delay is not None)
+        return (f"resilience: {counters['requests']} searches, {counters['hedged']} hedged "
+                f"({counters['hedges won']} won by the hedge, "
+                f"{counters['abandoned before sending']} abandoned before sending, {self.saved:.2f}s saved), "
+                f"{counters['retries']} retries" + (f" ({reasons})" if reasons else "") +
+                f", {counters['stopped on a rate limit']} stopped on a rate limit" +
+                (f"; hedge after p{self.hedge_percentile:g}: {delays}" if delays else ""))
+
+    def html_table(self):
+        rows = [(name, str(count)) for name, count in sorted(self.counters.items())]
+        rows.append(("seconds saved by the hedges", f"{self.saved:.2f}"))
+        rows += [(f"hedge delay of {endpoint}", "-" if delay is None else f"{delay * 1000:.0f} ms")
+                 for endpoint, delay in self.hedge_delays().items()]
+        body = "".join(f"<tr><td>{html.escape(name)}</td><td>{value}</td></tr>" for name, value in rows)
+        return f"<h2>Hedges and retries</h2><table><tr><th>Counter</th><th>Value</th></tr>{body}</table>"
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
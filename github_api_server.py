@@ -0,0 +1,1363 @@
+import argparse
+import base64
+import datetime
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    # Only gzip is offered then.
+    brotli = None
+
+# Local stand-in for the parts of the GitHub API used by the test modules, for offline and load testing.
+# The data is synthetic (millions of repositories and users by default, generated from a seed) plus a few fixed
+# accounts the tests look for. Search qualifiers are answered from prebuilt indexes: posting lists for words,
+# topics and owners, and stably sorted columns for numbers, dates and flags. The most selective predicate is read
+# from its index and the others only filter its candidates.
+#
+#   python github_api_server.py --port 8000 --repos 2000000 --users 1000000 --unlimited
+#   GH_API_URL=http://127.0.0.1:8000 GH_RAW_URL=http://127.0.0.1:8000/raw pytest github_api_repo.py
+
+EPOCH = datetime.date(2008, 1, 1)
+DAYS = (datetime.date(2024, 12, 31) - EPOCH).days
+
+WORDS = [
+    "python", "tesla", "phage", "signature", "data", "web", "api", "client", "server", "tool", "kit", "bot", "app",
+    "lib", "core", "cli", "ui", "docs", "notes", "config", "engine", "game", "robot", "arm", "sensor", "model",
+    "learning", "neural", "vision", "audio", "music", "video", "image", "chart", "graph", "math", "stats", "finance",
+    "crypto", "chain", "cloud", "docker", "kube", "infra", "deploy", "build", "test", "bench", "parser", "compiler",
+    "editor", "theme", "plugin", "shell", "script", "mobile", "android", "ios", "desktop", "linux", "windows",
+    "network", "proxy", "cache", "queue", "stream", "store", "database", "search", "index", "map", "geo", "weather",
+    "space", "rocket", "car", "electric", "battery", "solar", "energy", "health", "bio", "gene", "cell", "virus",
+    "lab", "school", "course", "tutorial", "example", "demo", "starter", "template", "awesome", "list", "blog",
+    "site", "portfolio", "resume", "chat", "mail", "auth", "security", "scanner", "crawler", "scraper", "pipeline",
+]
+TOPICS = [
+    "python", "javascript", "machine-learning", "deep-learning", "api", "cli", "web", "react", "docker",
+    "kubernetes", "linux", "game", "robotics", "iot", "data-science", "database", "security", "devops", "android",
+    "ios", "rust", "golang", "java", "hacktoberfest", "tutorial", "awesome", "blockchain", "bioinformatics",
+    "visualization", "automation",
+]
+LANGUAGES = ["Python", "JavaScript", "TypeScript", "Go", "Rust", "Java", "C", "C++", "Ruby", "Shell"]
+LICENSES = [
+    ("mit", "MIT License"), ("apache-2.0", "Apache License 2.0"), ("gpl-3.0", "GNU General Public License v3.0"),
+    ("bsd-3-clause", 'BSD 3-Clause "New" or "Revised" License'), ("eupl-1.1", "European Union Public License 1.1"),
+]
+LOCATIONS = [
+    "Copenhagen, Denmark", "Berlin, Germany", "Paris, France", "London, UK", "São Paulo, Brazil", "Tokyo, Japan",
+    "San Francisco, CA", "New York, NY", "Toronto, Canada", "Bangalore, India", "Sydney, Australia",
+    "Amsterdam, Netherlands", "Stockholm, Sweden", "Lisbon, Portugal", "Madrid, Spain",
+]
+
+# Accounts and repositories the test modules search for: (login, type).
+FIXTURE_USERS = [("github", "Organization"), ("renataberoli", "User"), ("voorloopnul", "User")]
+FIXTURE_REPOS = [
+    {"owner": "renataberoli", "name": "renataberoli.github.io", "description": "My personal website",
+     "language": "HTML", "stars": 2, "topics": []},
+    {"owner": "renataberoli", "name": "Mark_II", "description": "Mark_II robotic arm controlled by python",
+     "language": "Python", "stars": 1, "topics": ["python", "robotics"], "good_first_issues": 1,
+     "help_wanted_issues": 1},
+    {"owner": "renataberoli", "name": "email-signature", "description": "Email signature generator",
+     "language": "HTML", "stars": 0, "topics": [], "private": True, "readme": "signature"},
+    {"owner": "voorloopnul", "name": "phage-notes", "description": "Notes about phage therapy",
+     "language": "Python", "stars": 3, "topics": [], "readme": "phage bacteriophage"},
+]
+
+TOKEN = re.compile(r"[a-z0-9_]+")
+QUERY_TERM = re.compile(r'-?\w[\w.-]*:"[^"]*"|"[^"]*"|\S+')
+RANGE = re.compile(r"^(>=|<=|>|<)?(.+)$")
+MAX_PER_PAGE = 100
+# Bodies smaller than this are sent uncompressed, like GitHub does.
+COMPRESS_MIN_SIZE = 1024
+MAX_RESULTS = 1000
+
+# Requests per window (seconds) of each rate limit resource: (authenticated, anonymous, window).
+RATE_LIMITS = {
+    "search": (30, 10, 60),
+    "code_search": (10, 10, 60),
+    "core": (5000, 60, 3600),
+    # GraphQL needs a token; every query costs one point here, small queries cost about that on GitHub.
+    "graphql": (5000, 0, 3600),
+}
+# Nodes per page of a GraphQL connection, "first" is required.
+GRAPHQL_MAX_FIRST = 100
+# Characters of a text match fragment around its first match.
+FRAGMENT_SIZE = 200
+
+
+def tokens(text):
+    return TOKEN.findall(text.lower())
+
+
+def text_match(object_url, object_type, prop, text, words):
+    # Text match of one property (application/vnd.github.text-match+json): a fragment of the text around the first
+    # matched word, and the matched words with their indices in the fragment. Words match whole tokens, like the
+    # indexes. None when no word matches.
+    found = [match for match in TOKEN.finditer(text.lower()) if match.group() in words]
+    if not found:
+        return None
+    start = max(0, found[0].start() - FRAGMENT_SIZE // 4)
+    end = min(len(text), start + FRAGMENT_SIZE)
+    return {
+        "object_url": object_url, "object_type": object_type, "property": prop, "fragment": text[start:end],
+        "matches": [{"text": text[match.start():match.end()], "indices": [match.start() - start, match.end() - start]}
+                    for match in found if match.end() <= end],
+    }
+
+
+def day_of(value):
+    return (datetime.date.fromisoformat(value) - EPOCH).days
+
+
+def date_of(day):
+    return EPOCH + datetime.timedelta(days=int(day))
+
+
+def sorted_unique(values):
+    # np.unique without its hash table pass, which is much slower on these int64 arrays.
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+class SortedIndex:
+    # Stably sorted column: an exact value is a slice of ids in ascending order, a range is a slice to sort.
+
+    def __init__(self, values):
+        self.values = values
+        self.order = np.argsort(values, kind="stable")
+        self.sorted = values[self.order]
+
+    def bounds(self, low, high):
+        start = 0 if low is None else np.searchsorted(self.sorted, low, side="left")
+        end = len(self.sorted) if high is None else np.searchsorted(self.sorted, high, side="right")
+        return int(start), int(max(start, end))
+
+
+class PostingIndex:
+    # Inverted index term -> ascending ids, stored as one array with the offsets of every term.
+
+    def __init__(self, terms, ids, term_count):
+        size = int(ids.max(initial=0)) + 1
+        # A word repeated in one row is indexed once.
+        pairs = sorted_unique(terms.astype(np.int64) * size + ids)
+        self.ids = pairs % size
+        self.offsets = np.searchsorted(pairs // size, np.arange(term_count + 1))
+
+    def get(self, term):
+        if term is None or term + 1 >= len(self.offsets):
+            return self.ids[:0]
+        return self.ids[self.offsets[term]:self.offsets[term + 1]]
+
+
+class Posting:
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.size = len(ids)
+
+    def materialize(self):
+        return self.ids
+
+    def contains(self, candidates):
+        if not len(self.ids):
+            return np.zeros(len(candidates), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, candidates), len(self.ids) - 1)
+        return self.ids[positions] == candidates
+
+
+class Range:
+
+    def __init__(self, index, low, high):
+        self.index = index
+        self.low = low
+        self.high = high
+        self.start, self.end = index.bounds(low, high)
+        self.size = self.end - self.start
+
+    def materialize(self):
+        ids = self.index.order[self.start:self.end]
+        if self.low is not None and self.low == self.high:
+            return ids
+        return np.sort(ids)
+
+    def contains(self, candidates):
+        values = self.index.values[candidates]
+        mask = np.ones(len(candidates), dtype=bool)
+        if self.low is not None:
+            mask &= values >= self.low
+        if self.high is not None:
+            mask &= values <= self.high
+        return mask
+
+
+class Union:
+    # Any of several postings (e.g. a keyword in the name or in the description).
+
+    def __init__(self, postings):
+        self.ids = sorted_unique(np.concatenate([posting.materialize() for posting in postings]))
+        self.size = len(self.ids)
+
+    materialize = Posting.materialize
+    contains = Posting.contains
+
+
+def evaluate(predicates, count):
+    # The smallest predicate is read from its index, the others filter its candidates.
+    if not predicates:
+        return np.arange(count)
+    predicates = sorted(predicates, key=lambda predicate: predicate.size)
+    ids = predicates[0].materialize()
+    for predicate in predicates[1:]:
+        if not len(ids):
+            break
+        ids = ids[predicate.contains(ids)]
+    return ids
+
+
+def parse_range(condition, parse):
+    # ">=10", "<5", "10..20", "*..20", "10" -> (low, high) inclusive, None when open.
+    if ".." in condition:
+        low, high = condition.split("..", 1)
+        return (None if low == "*" else parse(low)), (None if high == "*" else parse(high))
+    operator, value = RANGE.match(condition).groups()
+    value = parse(value)
+    if operator == ">=":
+        return value, None
+    if operator == ">":
+        return value + 1, None
+    if operator == "<=":
+        return None, value
+    if operator == "<":
+        return None, value - 1
+    return value, value
+
+
+class QueryError(ValueError):
+    pass
+
+
+# The GraphQL subset the batching client sends: one operation of aliased fields with literal arguments (strings,
+# numbers, enums, lists and input objects), without variables or fragments.
+GRAPHQL_TOKEN = re.compile(r'[\s,]+|#[^\n]*|(?P<string>"(?:[^"\\]|\\.)*")|(?P<number>-?\d+(?:\.\d+)?)'
+                           r'|(?P<name>[_A-Za-z][_0-9A-Za-z]*)|(?P<punctuation>[{}():\[\]])|(?P<other>\S)')
+
+
+class GraphqlError(ValueError):
+    pass
+
+
+class GraphqlNotFound(GraphqlError):
+    pass
+
+
+class GraphqlField:
+    __slots__ = ("alias", "name", "arguments", "selections")
+
+    def __init__(self, alias, name, arguments, selections):
+        self.alias = alias
+        self.name = name
+        self.arguments = arguments
+        self.selections = selections
+
+
+class GraphqlParser:
+
+    def __init__(self, text):
+        self.tokens = []
+        for match in GRAPHQL_TOKEN.finditer(text):
+            if match.group("other"):
+                raise GraphqlError(f"Unexpected character '{match.group('other')}' (variables and fragments are not "
+                                   f"supported by the stand-in).")
+            for kind in ("string", "number", "name", "punctuation"):
+                if match.group(kind):
+                    self.tokens.append((kind, match.group(kind)))
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        kind, value = self.peek()
+        if kind is None or expected is not None and value != expected:
+            raise GraphqlError(f"Expected {expected or 'a token'}, got {value or 'the end of the query'}.")
+        self.position += 1
+        return kind, value
+
+    def document(self):
+        if self.peek() == ("name", "query"):
+            self.take()
+            if self.peek()[0] == "name":
+                self.take()
+        selections = self.selection_set()
+        if self.peek()[0] is not None:
+            raise GraphqlError("Only one operation per document is supported.")
+        return selections
+
+    def selection_set(self):
+        self.take("{")
+        selections = []
+        while self.peek()[1] != "}":
+            selections.append(self.field())
+        self.take("}")
+        return selections
+
+    def field(self):
+        kind, name = self.take()
+        if kind != "name":
+            raise GraphqlError(f"Expected a field name, got {name}.")
+        alias = name
+        if self.peek()[1] == ":":
+            self.take()
+            alias, name = name, self.take()[1]
+        arguments = {}
+        if self.peek()[1] == "(":
+            self.take()
+            while self.peek()[1] != ")":
+                argument = self.take()[1]
+                self.take(":")
+                arguments[argument] = self.value()
+            self.take(")")
+        selections = self.selection_set() if self.peek()[1] == "{" else None
+        return GraphqlField(alias, name, arguments, selections)
+
+    def value(self):
+        kind, value = self.take()
+        if kind == "string":
+            return json.loads(value)
+        if kind == "number":
+            return float(value) if "." in value else int(value)
+        if value == "[":
+            values = []
+            while self.peek()[1] != "]":
+                values.append(self.value())
+            self.take("]")
+            return values
+        if value == "{":
+            fields = {}
+            while self.peek()[1] != "}":
+                name = self.take()[1]
+                self.take(":")
+                fields[name] = self.value()
+            self.take("}")
+            return fields
+        if kind == "name":
+            # Enums stay strings.
+            return {"true": True, "false": False, "null": None}.get(value, value)
+        raise GraphqlError(f"Unexpected {value}.")
+
+
+class Dataset:
+
+    def __init__(self, repos=1_000_000, users=500_000, seed=42):
+        started = time.time()
+        rng = np.random.default_rng(seed)
+        self.words = list(WORDS)
+        self.word_ids = {word: index for index, word in enumerate(self.words)}
+        self.topic_ids = {topic: index for index, topic in enumerate(TOPICS)}
+        self.languages = list(LANGUAGES)
+        self.language_ids = {language.lower(): index for index, language in enumerate(self.languages)}
+        self.license_ids = {key: index for index, (key, _) in enumerate(LICENSES)}
+
+        users = max(users, len(FIXTURE_USERS) + 1)
+        repos = max(repos, len(FIXTURE_REPOS) + 1)
+        self.user_count = users
+        self.repo_count = repos
+        self.build_users(rng, users)
+        self.build_repos(rng, repos)
+        self.build_fixtures()
+        self.build_indexes()
+        self.build_time = time.time() - started
+
+    def word(self, word):
+        if word not in self.word_ids:
+            self.word_ids[word] = len(self.words)
+            self.words.append(word)
+        return self.word_ids[word]
+
+    def build_users(self, rng, count):
+        self.user_type = (rng.random(count) < 0.08).astype(np.int8)
+        self.user_word = rng.integers(0, len(WORDS), count, dtype=np.int64)
+        self.user_followers = np.minimum(rng.pareto(1.1, count) * 8, 500_000).astype(np.int64)
+        self.user_location = rng.integers(0, len(LOCATIONS), count).astype(np.int64)
+        self.user_language = rng.integers(0, len(LANGUAGES), count).astype(np.int64)
+        self.user_created = rng.integers(0, DAYS, count).astype(np.int64)
+
+        # Fixed accounts: "github" is the first user and owns many repositories, the others are the last ones.
+        self.fixture_user_ids = {}
+        for position, (login, user_type) in enumerate(FIXTURE_USERS):
+            user_id = 0 if position == 0 else count - len(FIXTURE_USERS) + position
+            self.fixture_user_ids[login] = user_id
+            self.user_type[user_id] = 1 if user_type == "Organization" else 0
+        self.fixture_user_logins = {user_id: login for login, user_id in self.fixture_user_ids.items()}
+
+    def build_repos(self, rng, count):
+        synthetic_owners = self.user_count - len(FIXTURE_USERS) + 1
+        # Few accounts own most of the repositories, like on GitHub.
+        owner = (rng.random(count) ** 3 * synthetic_owners).astype(np.int64)
+        self.owner = np.where(owner == 0, 0, np.minimum(owner, synthetic_owners - 1))
+        self.name_words = rng.integers(0, len(WORDS), (count, 2), dtype=np.int64)
+        self.description_words = rng.integers(0, len(WORDS), (count, 4), dtype=np.int64)
+        self.readme_words = rng.integers(0, len(WORDS), (count, 3), dtype=np.int64)
+
+        topic_count = rng.integers(0, 4, count)
+        first = rng.integers(0, len(TOPICS), count)
+        step = rng.integers(1, len(TOPICS) // 2, count)
+        second = step + rng.integers(1, len(TOPICS) // 2, count)
+        topics = np.stack([first, (first + step) % len(TOPICS), (first + second) % len(TOPICS)], axis=1)
+        self.topics = np.where(np.arange(3) < topic_count[:, None], topics, -1)
+        self.topic_count = topic_count.astype(np.int64)
+
+        self.size = np.minimum(rng.lognormal(6, 2.2, count), 5_000_000).astype(np.int64)
+        self.stars = np.minimum(rng.pareto(1.0, count) * 3, 400_000).astype(np.int64)
+        self.forks = (self.stars * rng.random(count) * 0.6).astype(np.int64)
+        self.created = rng.integers(0, DAYS, count).astype(np.int64)
+        self.pushed = self.created + (rng.random(count) * (DAYS - self.created)).astype(np.int64)
+        self.seconds = rng.integers(0, 86400, count).astype(np.int64)
+        self.language = self.user_language[self.owner]
+        self.license = np.where(rng.random(count) < 0.6, rng.integers(0, len(LICENSES), count), -1).astype(np.int64)
+        self.archived = (rng.random(count) < 0.05).astype(np.int64)
+        self.mirror = (rng.random(count) < 0.01).astype(np.int64)
+        self.private = (rng.random(count) < 0.03).astype(np.int64)
+        self.funding = (rng.random(count) < 0.05).astype(np.int64)
+        self.sponsorable = (rng.random(count) < 0.1).astype(np.int64)
+        self.good_first_issues = np.where(rng.random(count) < 0.1, rng.integers(1, 6, count), 0).astype(np.int64)
+        self.help_wanted_issues = np.where(rng.random(count) < 0.1, rng.integers(1, 6, count), 0).astype(np.int64)
+        self.other_issues = rng.integers(0, 10, count).astype(np.int64)
+
+    def build_fixtures(self):
+        # The fixed repositories take the last ids, their texts replace the generated words in the indexes.
+        self.fixture_repos = {}
+        self.fixture_repo_ids = {}
+        self.fixture_terms = {"name": [], "description": [], "readme": []}
+        first = self.repo_count - len(FIXTURE_REPOS)
+        for position, fixture in enumerate(FIXTURE_REPOS):
+            repo_id = first + position
+            self.fixture_repos[repo_id] = fixture
+            self.fixture_repo_ids[(fixture["owner"].lower(), fixture["name"].lower())] = repo_id
+            self.owner[repo_id] = self.fixture_user_ids[fixture["owner"]]
+            self.stars[repo_id] = fixture["stars"]
+            self.forks[repo_id] = 0
+            self.size[repo_id] = 50
+            self.created[repo_id] = day_of("2020-06-01")
+            self.pushed[repo_id] = day_of("2021-11-24")
+            self.language[repo_id] = self.language_id(fixture["language"])
+            self.license[repo_id] = -1
+            self.archived[repo_id] = 0
+            self.mirror[repo_id] = 0
+            self.private[repo_id] = int(fixture.get("private", False))
+            self.funding[repo_id] = 0
+            self.good_first_issues[repo_id] = fixture.get("good_first_issues", 0)
+            self.help_wanted_issues[repo_id] = fixture.get("help_wanted_issues", 0)
+            self.other_issues[repo_id] = 0
+            topics = [self.topic_ids[topic] for topic in fixture["topics"]]
+            self.topics[repo_id] = topics + [-1] * (3 - len(topics))
+            self.topic_count[repo_id] = len(topics)
+
+            name_terms = [self.word(word) for word in tokens(fixture["name"])]
+            description_terms = [self.word(word) for word in tokens(fixture["description"])]
+            readme_terms = [self.word(word) for word in tokens(fixture.get("readme", ""))]
+            self.fixture_terms["name"] += [(term, repo_id) for term in name_terms]
+            self.fixture_terms["description"] += [(term, repo_id) for term in description_terms]
+            self.fixture_terms["readme"] += [(term, repo_id) for term in
+                                             name_terms + description_terms + readme_terms]
+
+        self.login_fixture_terms = []
+        for login, user_id in self.fixture_user_ids.items():
+            self.login_fixture_terms += [(self.word(word), user_id) for word in tokens(login)]
+
+    def language_id(self, language):
+        if language.lower() not in self.language_ids:
+            self.language_ids[language.lower()] = len(self.languages)
+            self.languages.append(language)
+        return self.language_ids[language.lower()]
+
+    def word_postings(self, columns, fixtures, count):
+        # Posting index over the word columns of the synthetic rows, with the fixed rows' own words.
+        fixture_ids = np.array(sorted({row for _, row in fixtures}), dtype=np.int64)
+        terms = []
+        ids = []
+        synthetic = np.ones(count, dtype=bool)
+        synthetic[fixture_ids] = False
+        rows = np.flatnonzero(synthetic)
+        for column in columns:
+            terms.append(column[rows])
+            ids.append(rows)
+        if fixtures:
+            terms.append(np.array([term for term, _ in fixtures], dtype=np.int64))
+            ids.append(np.array([row for _, row in fixtures], dtype=np.int64))
+        return PostingIndex(np.concatenate(terms), np.concatenate(ids), len(self.words))
+
+    def build_indexes(self):
+        names = [self.name_words[:, 0], self.name_words[:, 1]]
+        descriptions = [self.description_words[:, column] for column in range(4)]
+        readmes = names + descriptions + [self.readme_words[:, column] for column in range(3)]
+        self.name_index = self.word_postings(names, self.fixture_terms["name"], self.repo_count)
+        self.description_index = self.word_postings(descriptions, self.fixture_terms["description"],
+                                                    self.repo_count)
+        self.readme_index = self.word_postings(readmes, self.fixture_terms["readme"], self.repo_count)
+
+        has_topic = self.topics >= 0
+        self.topic_index = PostingIndex(self.topics[has_topic], np.nonzero(has_topic)[0], len(TOPICS))
+
+        self.repo_indexes = {
+            name: SortedIndex(values) for name, values in {
+                "owner": self.owner, "size": self.size, "stars": self.stars, "forks": self.forks,
+                "created": self.created, "pushed": self.pushed, "language": self.language,
+                "license": self.license, "archived": self.archived, "mirror": self.mirror,
+                "private": self.private, "funding": self.funding, "topics": self.topic_count,
+                "sponsorable": self.sponsorable,
+                "good-first-issues": self.good_first_issues, "help-wanted-issues": self.help_wanted_issues,
+            }.items()
+        }
+
+        self.user_repos = np.bincount(self.owner[self.private == 0], minlength=self.user_count).astype(np.int64)
+        self.login_index = self.word_postings([self.user_word], self.login_fixture_terms, self.user_count)
+        location_terms = [sorted({self.word(word) for word in tokens(location)}) for location in LOCATIONS]
+        location_pairs = [(term, location) for location, terms in enumerate(location_terms) for term in terms]
+        self.location_index = PostingIndex(np.array([term for term, _ in location_pairs], dtype=np.int64),
+                                           np.array([location for _, location in location_pairs], dtype=np.int64),
+                                           len(self.words))
+        self.user_indexes = {
+            name: SortedIndex(values) for name, values in {
+                "type": self.user_type.astype(np.int64), "followers": self.user_followers,
+                "repos": self.user_repos, "location": self.user_location, "language": self.user_language,
+                "created": self.user_created,
+            }.items()
+        }
+
+    # Names.
+
+    def login(self, user_id):
+        user_id = int(user_id)
+        if user_id in self.fixture_user_logins:
+            return self.fixture_user_logins[user_id]
+        return f"{self.words[self.user_word[user_id]]}-{user_id}"
+
+    def user_id(self, login):
+        login = login.lower()
+        if login in self.fixture_user_ids:
+            return self.fixture_user_ids[login]
+        try:
+            user_id = int(login.rsplit("-", 1)[1])
+        except (IndexError, ValueError):
+            return None
+        if 0 <= user_id < self.user_count and self.login(user_id) == login:
+            return user_id
+        return None
+
+    def repo_name(self, repo_id):
+        repo_id = int(repo_id)
+        if repo_id in self.fixture_repos:
+            return self.fixture_repos[repo_id]["name"]
+        first, second = self.name_words[repo_id]
+        return f"{self.words[first]}-{self.words[second]}-{repo_id}"
+
+    def repo_id(self, owner, name):
+        key = (owner.lower(), name.lower())
+        if key in self.fixture_repo_ids:
+            return self.fixture_repo_ids[key]
+        try:
+            repo_id = int(name.rsplit("-", 1)[1])
+        except (IndexError, ValueError):
+            return None
+        if 0 <= repo_id < self.repo_count and repo_id not in self.fixture_repos and \
+                self.repo_name(repo_id).lower() == key[1] and self.login(self.owner[repo_id]) == key[0]:
+            return repo_id
+        return None
+
+    def description(self, repo_id):
+        repo_id = int(repo_id)
+        if repo_id in self.fixture_repos:
+            return self.fixture_repos[repo_id]["description"]
+        return " ".join(self.words[word] for word in self.description_words[repo_id]).capitalize()
+
+    def readme(self, repo_id, padding=0):
+        repo_id = int(repo_id)
+        if repo_id in self.fixture_repos:
+            extra = self.fixture_repos[repo_id].get("readme", "")
+        else:
+            extra = " ".join(self.words[word] for word in self.readme_words[repo_id])
+        text = f"# {self.repo_name(repo_id)}\n\n{self.description(repo_id)}\n\n{extra}\n"
+        if padding:
+            line = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.\n"
+            text += line * (padding // len(line))
+        return text.encode()
+
+    # Searches.
+
+    def term(self, word):
+        return self.word_ids.get(word)
+
+    def keyword_predicates(self, keywords, fields):
+        predicates = []
+        for keyword in keywords:
+            for word in tokens(keyword):
+                postings = [Posting(index.get(self.term(word))) for index in fields]
+                predicates.append(postings[0] if len(postings) == 1 else Union(postings))
+        return predicates
+
+    def search_repositories(self, keywords, qualifiers):
+        indexes = self.repo_indexes
+        predicates = []
+        fields = {"name": self.name_index, "description": self.description_index, "readme": self.readme_index}
+        keyword_fields = [fields[field] for field in qualifiers.pop("in", []) if field in fields]
+        predicates += self.keyword_predicates(keywords, keyword_fields or [self.name_index, self.description_index])
+
+        for name, values in qualifiers.items():
+            for value in values:
+                predicates.append(self.repository_predicate(name, value, indexes))
+        if "is" not in qualifiers or "public" in qualifiers["is"]:
+            predicates.append(Range(indexes["private"], 0, 0))
+        return evaluate([predicate for predicate in predicates if predicate is not None], self.repo_count)
+
+    def repository_predicate(self, name, value, indexes):
+        if name in ("user", "org"):
+            return Range(indexes["owner"], *[self.user_id(value) if self.user_id(value) is not None else -1] * 2)
+        if name == "repo":
+            owner, _, repo_name = value.partition("/")
+            repo_id = self.repo_id(owner, repo_name)
+            return Posting(np.array([] if repo_id is None else [repo_id], dtype=np.int64))
+        if name in ("size", "stars", "forks", "topics", "good-first-issues", "help-wanted-issues"):
+            return Range(indexes[name], *parse_range(value, int))
+        if name == "followers":
+            return Range(indexes["stars"], *parse_range(value, int))
+        if name in ("created", "pushed"):
+            return Range(indexes[name], *parse_range(value, day_of))
+        if name == "language":
+            return Range(indexes["language"], *[self.language_ids.get(value.lower(), -2)] * 2)
+        if name == "license":
+            return Range(indexes["license"], *[self.license_ids.get(value.lower(), -2)] * 2)
+        if name == "topic":
+            return Posting(self.topic_index.get(self.topic_ids.get(value.lower())))
+        if name in ("archived", "mirror"):
+            flag = int(value.lower() == "true")
+            return Range(indexes[name], flag, flag)
+        if name == "has" and value == "funding-file":
+            return Range(indexes["funding"], 1, 1)
+        if name == "is":
+            if value == "private":
+                # Private repositories are never visible to the stand-in's callers.
+                return Posting(np.array([], dtype=np.int64))
+            if value == "sponsorable":
+                return Range(indexes["sponsorable"], 1, 1)
+            return None
+        raise QueryError(f"Unsupported qualifier: {name}")
+
+    def search_users(self, keywords, qualifiers):
+        indexes = self.user_indexes
+        qualifiers.pop("in", None)
+        predicates = self.keyword_predicates(keywords, [self.login_index])
+        for name, values in qualifiers.items():
+            for value in values:
+                if name == "type":
+                    user_type = 1 if value.lower() in ("org", "organization") else 0
+                    predicates.append(Range(indexes["type"], user_type, user_type))
+                elif name in ("followers", "repos"):
+                    predicates.append(Range(indexes[name], *parse_range(value, int)))
+                elif name == "created":
+                    predicates.append(Range(indexes["created"], *parse_range(value, day_of)))
+                elif name == "language":
+                    language = self.language_ids.get(value.lower(), -2)
+                    predicates.append(Range(indexes["language"], language, language))
+                elif name == "location":
+                    locations = [self.location_index.get(self.term(word)) for word in tokens(value)]
+                    matching = locations[0]
+                    for other in locations[1:]:
+                        matching = np.intersect1d(matching, other)
+                    predicates.append(Union([Range(indexes["location"], int(location), int(location))
+                                             for location in matching] or [Posting(np.array([], dtype=np.int64))]))
+                else:
+                    raise QueryError(f"Unsupported qualifier: {name}")
+        return evaluate(predicates, self.user_count)
+
+    def search_code(self, keywords, qualifiers):
+        # Every repository has one indexed file, its README.md.
+        indexes = self.repo_indexes
+        qualifiers.pop("in", None)
+        if not keywords:
+            raise QueryError("Code search needs at least one search term.")
+        predicates = self.keyword_predicates(keywords, [self.readme_index])
+        for name, values in qualifiers.items():
+            for value in values:
+                if name == "extension" and value.lower() != "md" or name == "filename" and \
+                        value.lower() != "readme.md":
+                    predicates.append(Posting(np.array([], dtype=np.int64)))
+                elif name in ("user", "org", "repo", "language"):
+                    predicates.append(self.repository_predicate(name, value, indexes))
+                elif name not in ("extension", "filename", "path"):
+                    raise QueryError(f"Unsupported qualifier: {name}")
+        predicates.append(Range(indexes["private"], 0, 0))
+        return evaluate(predicates, self.repo_count)
+
+    def ordered(self, ids, sort_values, descending, limit):
+        # Only the first "limit" results are ever served, so only those are sorted.
+        if sort_values is None:
+            return ids[:limit]
+        keys = sort_values[ids]
+        if descending:
+            keys = -keys
+        if len(ids) > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            ids, keys = ids[top], keys[top]
+        return ids[np.lexsort((ids, keys))]
+
+
+class RateLimits:
+
+    def __init__(self, limits=None, unlimited=False):
+        self.limits = dict(RATE_LIMITS, **(limits or {}))
+        self.unlimited = unlimited
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def take(self, client, authenticated, resource):
+        # Returns the rate limit headers of the request and whether it is over the limit.
+        limit_auth, limit_anon, window = self.limits[resource]
+        limit = limit_auth if authenticated else limit_anon
+        if self.unlimited:
+            limit = 1_000_000
+        now = time.time()
+        with self.lock:
+            reset, used = self.windows.get((client, resource), (0, 0))
+            if now >= reset:
+                reset, used = int(now) + window, 0
+            exceeded = used >= limit
+            if not exceeded:
+                used += 1
+            self.windows[(client, resource)] = (reset, used)
+        headers = {
+            "X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(max(0, limit - used)),
+            "X-RateLimit-Reset": str(reset), "X-RateLimit-Used": str(used), "X-RateLimit-Resource": resource,
+        }
+        return headers, exceeded
+
+
+class Faults:
+    # Misbehaviour of GitHub's search endpoint drawn at random for every search: a stall before the response, a 502,
+    # or a partial page with "incomplete_results": true.
+
+    def __init__(self, stall_rate=0.0, stall_seconds=3.0, error_rate=0.0, incomplete_rate=0.0, seed=None):
+        self.rates = (("stall", stall_rate), ("error", error_rate), ("incomplete", incomplete_rate))
+        self.stall_seconds = stall_seconds
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self):
+        with self.lock:
+            value = self.random.random()
+        for fault, rate in self.rates:
+            if value < rate:
+                return fault
+            value -= rate
+        return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "GitHubStandIn/1.0"
+    # The headers and the body are written separately, Nagle's algorithm would hold the body for a delayed ACK.
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        (re.compile(r"^/search/(repositories|users|code)$"), "search"),
+        (re.compile(r"^/users/([^/]+)$"), "user"),
+        (re.compile(r"^/users/([^/]+)/followers$"), "followers"),
+        (re.compile(r"^/users/([^/]+)/repos$"), "user_repos"),
+        (re.compile(r"^/repos/([^/]+)/([^/]+)$"), "repo"),
+        (re.compile(r"^/repos/([^/]+)/([^/]+)/issues$"), "issues"),
+        (re.compile(r"^/repos/([^/]+)/([^/]+)/readme$"), "readme"),
+        (re.compile(r"^/repos/([^/]+)/([^/]+)/contents/?(.*)$"), "contents"),
+        (re.compile(r"^/raw/([^/]+)/([^/]+)/([^/]+)/(.+)$"), "raw"),
+        (re.compile(r"^/rate_limit$"), "rate_limit"),
+    ]
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    @property
+    def dataset(self):
+        return self.server.dataset
+
+    def begin(self):
+        url = urlsplit(self.path)
+        self.base = f"http://{self.headers.get('Host', '%s:%s' % self.server.server_address[:2])}"
+        self.params = dict(parse_qsl(url.query, keep_blank_values=True))
+        self.extra_headers = {}
+        return url
+
+    def authorize(self, resource):
+        # Checks the token and takes a request from its rate limit, or sends the error and returns False.
+        authorization = self.headers.get("Authorization")
+        if authorization and self.server.tokens is not None and \
+                authorization.split(" ", 1)[-1] not in self.server.tokens:
+            self.send_json({"message": "Bad credentials"}, 401)
+            return False
+        if resource is None:
+            return True
+        client = authorization or self.client_address[0]
+        headers, exceeded = self.server.rate_limits.take(client, authorization is not None, resource)
+        self.extra_headers.update(headers)
+        if exceeded:
+            self.send_json({"message": "API rate limit exceeded"}, 403)
+            return False
+        return True
+
+    def do_GET(self):
+        url = self.begin()
+        for pattern, handler in self.ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            return self.send_json({"message": "Not Found"}, 404)
+
+        resource = "core"
+        if handler == "raw":
+            resource = None
+        elif handler == "search":
+            resource = "code_search" if match.group(1) == "code" else "search"
+        if not self.authorize(resource):
+            return
+        self.fault = self.server.faults.draw() if handler == "search" else None
+        if self.fault == "stall":
+            time.sleep(self.server.faults.stall_seconds)
+        elif self.fault == "error":
+            return self.send_json({"message": "Server Error"}, 502)
+        try:
+            getattr(self, f"get_{handler}")(*match.groups())
+        except QueryError as error:
+            self.send_json({"message": "Validation Failed", "errors": [{"message": str(error)}]}, 422)
+
+    def do_POST(self):
+        url = self.begin()
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if url.path != "/graphql":
+            return self.send_json({"message": "Not Found"}, 404)
+        if "Authorization" not in self.headers:
+            return self.send_json({"message": "This endpoint requires you to be authenticated."}, 401)
+        if not self.authorize("graphql"):
+            return
+        try:
+            query = json.loads(body)["query"]
+            selections = GraphqlParser(query).document()
+        except (ValueError, KeyError, TypeError) as error:
+            return self.send_json({"errors": [{"message": f"Problems parsing the query: {error}"}]})
+        data = {}
+        errors = []
+        root = self.graphql_root()
+        for selection in selections:
+            try:
+                data[selection.alias] = self.graphql_resolve(root, selection)
+            except GraphqlNotFound as error:
+                data[selection.alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [selection.alias], "message": str(error)})
+            except GraphqlError as error:
+                return self.send_json({"errors": [{"path": [selection.alias], "message": str(error)}]})
+        self.send_json(dict({"data": data}, **({"errors": errors} if errors else {})))
+
+    def send_body(self, body, status=200, content_type="application/json; charset=utf-8"):
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        encoding = self.content_encoding(body)
+        if encoding == "br":
+            body = brotli.compress(body, quality=4)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+            self.send_header("Vary", "Accept-Encoding")
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        for name, value in self.extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def content_encoding(self, body):
+        if not self.server.compression or len(body) < COMPRESS_MIN_SIZE:
+            return None
+        accepted = [encoding.split(";")[0].strip() for encoding in self.headers.get("Accept-Encoding", "").split(",")]
+        if "br" in accepted and brotli is not None:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def send_json(self, data, status=200):
+        self.send_body(json.dumps(data).encode(), status)
+
+    def page(self, default_per_page=30):
+        try:
+            per_page = min(MAX_PER_PAGE, max(1, int(self.params.get("per_page", default_per_page))))
+            page = max(1, int(self.params.get("page", 1)))
+        except ValueError:
+            raise QueryError("page and per_page must be numbers.")
+        return page, per_page
+
+    def link_header(self, path, page, per_page, total):
+        last = max(1, -(-total // per_page))
+        links = []
+        for rel, number in (("prev", page - 1), ("next", page + 1), ("last", last), ("first", 1)):
+            if rel in ("prev", "first") and page == 1 or rel in ("next", "last") and page >= last:
+                continue
+            query = urlencode(dict(self.params, page=number))
+            links.append(f'<{self.base}{path}?{query}>; rel="{rel}"')
+        if links:
+            self.extra_headers["Link"] = ", ".join(links)
+
+    def paginate(self, path, ids, default_per_page=30):
+        page, per_page = self.page(default_per_page)
+        self.link_header(path, page, per_page, len(ids))
+        return ids[(page - 1) * per_page:page * per_page]
+
+    # Search endpoints.
+
+    def get_search(self, kind):
+        query = self.params.get("q", "")
+        if not query.strip():
+            raise QueryError("The q parameter is required.")
+        keywords = []
+        qualifiers = {}
+        for term in QUERY_TERM.findall(query):
+            name, separator, value = term.partition(":")
+            if separator and not term.startswith('"') and value:
+                qualifiers.setdefault(name.lower(), []).append(value.strip('"'))
+            else:
+                keywords.append(term.strip('"'))
+
+        dataset = self.dataset
+        # The searches consume the "in" qualifier.
+        fields = list(qualifiers.get("in", []))
+        ids = getattr(dataset, f"search_{kind}")(keywords, qualifiers)
+        page, per_page = self.page()
+        if (page - 1) * per_page >= MAX_RESULTS and len(ids):
+            raise QueryError(f"Only the first {MAX_RESULTS} search results are available.")
+
+        sort_values, descending = self.sort_order(kind)
+        limit = min(page * per_page, MAX_RESULTS)
+        ordered = dataset.ordered(ids, sort_values, descending, limit)[(page - 1) * per_page:limit]
+        self.link_header(f"/search/{kind}", page, per_page, min(len(ids), MAX_RESULTS))
+
+        build = {"repositories": self.repository, "users": self.user_summary, "code": self.code_result}[kind]
+        if self.fault == "incomplete":
+            # The search timed out on GitHub's side: only part of the results.
+            ordered = ordered[:len(ordered) // 2]
+        items = [dict(build(item_id), score=1.0) for item_id in ordered]
+        if "text-match" in self.headers.get("Accept", ""):
+            words = {word for keyword in keywords for word in tokens(keyword)}
+            for item_id, item in zip(ordered, items):
+                item["text_matches"] = self.text_matches(kind, item_id, item, words, fields)
+        self.send_json({"total_count": int(len(ids)), "incomplete_results": self.fault == "incomplete", "items": items})
+
+    def text_matches(self, kind, item_id, item, words, fields):
+        # The properties the keywords were searched in: name and description of a repository unless "in:" says
+        # otherwise (GitHub gives no README fragments), the login of a user, the content of a file.
+        dataset = self.dataset
+        if kind == "users":
+            properties = [("User", "login", item["login"])]
+        elif kind == "code":
+            properties = [("FileContent", "content", dataset.readme(item_id).decode())]
+        else:
+            searched = [field for field in fields if field in ("name", "description")] or \
+                ([] if fields else ["name", "description"])
+            properties = [("Repository", field, item[field] or "") for field in searched]
+        matches = [text_match(item["url"], object_type, prop, text, words) for object_type, prop, text in properties]
+        return [match for match in matches if match is not None]
+
+    def sort_order(self, kind):
+        dataset = self.dataset
+        sort = self.params.get("sort", "")
+        descending = self.params.get("order", "desc") != "asc"
+        if kind == "users":
+            columns = {"followers": dataset.user_followers, "repositories": dataset.user_repos,
+                       "joined": dataset.user_created}
+            # Best match: the most followed accounts first.
+            return columns.get(sort, dataset.user_followers), descending if sort in columns else True
+        columns = {"stars": dataset.stars, "forks": dataset.forks, "updated": dataset.pushed,
+                   "help-wanted-issues": dataset.help_wanted_issues}
+        if kind == "code":
+            return None, True
+        return columns.get(sort, dataset.stars), descending if sort in columns else True
+
+    # Resources.
+
+    def owner(self, user_id):
+        login = self.dataset.login(user_id)
+        url = f"{self.base}/users/{login}"
+        return {
+            "login": login, "id": int(user_id), "node_id": f"U_{user_id}",
+            "avatar_url": f"{self.base}/avatars/{login}", "url": url, "html_url": f"https://github.com/{login}",
+            "followers_url": f"{url}/followers", "following_url": f"{url}/following{{/other_user}}",
+            "repos_url": f"{url}/repos",
+            "type": "Organization" if self.dataset.user_type[user_id] else "User", "site_admin": False,
+        }
+
+    def user_summary(self, user_id):
+        return self.owner(user_id)
+
+    def repository(self, repo_id):
+        dataset = self.dataset
+        repo_id = int(repo_id)
+        owner = self.owner(dataset.owner[repo_id])
+        name = dataset.repo_name(repo_id)
+        full_name = f"{owner['login']}/{name}"
+        url = f"{self.base}/repos/{full_name}"
+        license_id = dataset.license[repo_id]
+        clock = time.strftime("%H:%M:%S", time.gmtime(dataset.seconds[repo_id]))
+        created = f"{date_of(dataset.created[repo_id])}T{clock}Z"
+        pushed = f"{date_of(dataset.pushed[repo_id])}T{clock}Z"
+        issues = int(dataset.good_first_issues[repo_id] + dataset.help_wanted_issues[repo_id] +
+                     dataset.other_issues[repo_id])
+        return {
+            "id": repo_id, "node_id": f"R_{repo_id}", "name": name, "full_name": full_name,
+            "private": bool(dataset.private[repo_id]), "owner": owner,
+            "html_url": f"https://github.com/{full_name}", "description": dataset.description(repo_id),
+            "fork": False, "url": url,
+            "issues_url": f"{url}/issues{{/number}}", "contents_url": f"{url}/contents/{{+path}}",
+            "created_at": created, "updated_at": pushed, "pushed_at": pushed,
+            "size": int(dataset.size[repo_id]), "stargazers_count": int(dataset.stars[repo_id]),
+            "watchers_count": int(dataset.stars[repo_id]), "forks_count": int(dataset.forks[repo_id]),
+            "language": dataset.languages[dataset.language[repo_id]],
+            "has_issues": True, "open_issues_count": issues,
+            "mirror_url": f"https://mirror.example.org/{full_name}.git" if dataset.mirror[repo_id] else None,
+            "archived": bool(dataset.archived[repo_id]), "disabled": False,
+            "license": None if license_id < 0 else {
+                "key": LICENSES[license_id][0], "name": LICENSES[license_id][1],
+                "spdx_id": LICENSES[license_id][0].upper()},
+            "topics": [TOPICS[topic] for topic in dataset.topics[repo_id] if topic >= 0],
+            "visibility": "private" if dataset.private[repo_id] else "public",
+            "forks": int(dataset.forks[repo_id]), "open_issues": issues, "watchers": int(dataset.stars[repo_id]),
+            "default_branch": "main",
+        }
+
+    def code_result(self, repo_id):
+        repository = self.repository(repo_id)
+        return {
+            "name": "README.md", "path": "README.md",
+            "sha": hashlib.sha1(self.dataset.readme(repo_id)).hexdigest(),
+            "url": f"{repository['url']}/contents/README.md?ref=main",
+            "html_url": f"{repository['html_url']}/blob/main/README.md", "repository": repository,
+        }
+
+    def find_user(self, login):
+        user_id = self.dataset.user_id(login)
+        if user_id is None:
+            self.send_json({"message": "Not Found"}, 404)
+        return user_id
+
+    def find_repo(self, owner, name):
+        repo_id = self.dataset.repo_id(owner, name)
+        if repo_id is None or self.dataset.private[repo_id]:
+            self.send_json({"message": "Not Found"}, 404)
+            return None
+        return repo_id
+
+    def user_profile(self, user_id):
+        dataset = self.dataset
+        return dict(
+            self.owner(user_id), name=dataset.login(user_id).capitalize(), company=None, blog="",
+            location=LOCATIONS[dataset.user_location[user_id]], email=None, bio=None,
+            public_repos=int(dataset.user_repos[user_id]), followers=int(dataset.user_followers[user_id]),
+            following=0, created_at=f"{date_of(dataset.user_created[user_id])}T00:00:00Z")
+
+    def follower_ids(self, user_id):
+        # Deterministic pseudo-random followers.
+        indexes = np.arange(int(self.dataset.user_followers[user_id]), dtype=np.int64)
+        return (int(user_id) * 7919 + indexes * 104729 + 1) % self.dataset.user_count
+
+    def public_repo_ids(self, user_id):
+        owned = Range(self.dataset.repo_indexes["owner"], user_id, user_id).materialize()
+        return owned[self.dataset.private[owned] == 0]
+
+    def issue_labels(self, repo_id):
+        dataset = self.dataset
+        return (["good first issue"] * int(dataset.good_first_issues[repo_id]) +
+                ["help wanted"] * int(dataset.help_wanted_issues[repo_id]) +
+                ["bug"] * int(dataset.other_issues[repo_id]))
+
+    def issue(self, repo_id, full_name, number, label):
+        return {
+            "id": int(repo_id) * 100 + number, "number": number,
+            "url": f"{self.base}/repos/{full_name}/issues/{number}",
+            "html_url": f"https://github.com/{full_name}/issues/{number}", "title": f"Issue {number}",
+            "state": "open", "labels": [{"name": label, "default": True}],
+        }
+
+    def get_user(self, login):
+        user_id = self.find_user(login)
+        if user_id is not None:
+            self.send_json(self.user_profile(user_id))
+
+    def get_followers(self, login):
+        user_id = self.find_user(login)
+        if user_id is None:
+            return
+        followers = self.paginate(f"/users/{login}/followers", self.follower_ids(user_id))
+        self.send_json([self.owner(follower) for follower in followers])
+
+    def get_user_repos(self, login):
+        user_id = self.find_user(login)
+        if user_id is None:
+            return
+        owned = self.public_repo_ids(user_id)
+        self.send_json([self.repository(repo_id) for repo_id in self.paginate(f"/users/{login}/repos", owned)])
+
+    def get_repo(self, owner, name):
+        repo_id = self.find_repo(owner, name)
+        if repo_id is not None:
+            self.send_json(self.repository(repo_id))
+
+    def get_issues(self, owner, name):
+        repo_id = self.find_repo(owner, name)
+        if repo_id is None:
+            return
+        labels = self.issue_labels(repo_id)
+        numbers = self.paginate(f"/repos/{owner}/{name}/issues", np.arange(len(labels)))
+        self.send_json([self.issue(repo_id, f"{owner}/{name}", int(number) + 1, labels[number])
+                        for number in numbers])
+
+    def file_entry(self, owner, name, path, kind="file", size=0):
+        url = f"{self.base}/repos/{owner}/{name}/contents/{path}"
+        return {
+            "name": path.rsplit("/", 1)[-1], "path": path, "type": kind, "size": size, "url": url,
+            "download_url": f"{self.base}/raw/{owner}/{name}/main/{path}" if kind == "file" else None,
+        }
+
+    def get_readme(self, owner, name):
+        repo_id = self.find_repo(owner, name)
+        if repo_id is None:
+            return
+        content = self.dataset.readme(repo_id, self.readme_padding(repo_id))
+        if "raw" in self.headers.get("Accept", ""):
+            # application/vnd.github.raw: the file itself instead of its description.
+            return self.send_body(content, content_type="text/plain; charset=utf-8")
+        self.send_json(dict(self.file_entry(owner, name, "README.md", size=len(content)),
+                            encoding="base64", content=base64.b64encode(content).decode()))
+
+    def get_contents(self, owner, name, path):
+        repo_id = self.find_repo(owner, name)
+        if repo_id is None:
+            return
+        path = path.strip("/")
+        readme = self.dataset.readme(repo_id, self.readme_padding(repo_id))
+        if path == "":
+            entries = [self.file_entry(owner, name, "README.md", size=len(readme))]
+            if self.dataset.funding[repo_id]:
+                entries.insert(0, self.file_entry(owner, name, ".github", "dir"))
+            self.send_json(entries)
+        elif path == ".github" and self.dataset.funding[repo_id]:
+            self.send_json([self.file_entry(owner, name, ".github/FUNDING.yml", size=24)])
+        elif path == "README.md":
+            self.send_json(dict(self.file_entry(owner, name, path, size=len(readme)),
+                                encoding="base64", content=base64.b64encode(readme).decode()))
+        else:
+            self.send_json({"message": "Not Found"}, 404)
+
+    def readme_padding(self, repo_id):
+        # Bigger repositories get longer READMEs, up to --readme-padding bytes.
+        return min(self.server.readme_padding, int(self.dataset.size[repo_id]) * 16)
+
+    def get_raw(self, owner, name, branch, path):
+        repo_id = self.dataset.repo_id(owner, name)
+        if repo_id is None or self.dataset.private[repo_id] or branch != "main" or path != "README.md":
+            return self.send_body(b"404: Not Found", 404, "text/plain; charset=utf-8")
+        self.send_body(self.dataset.readme(repo_id, self.readme_padding(repo_id)),
+                       content_type="text/plain; charset=utf-8")
+
+    def get_rate_limit(self):
+        self.send_json({"resources": {}, "rate": {}})
+
+    # GraphQL: every object is a dict of its fields, the fields with arguments (connections) are functions.
+
+    def graphql_resolve(self, node, field):
+        if field.name not in node:
+            raise GraphqlError(f"Field '{field.name}' doesn't exist on type '{node['__typename']}'.")
+        value = node[field.name]
+        if callable(value):
+            try:
+                inspect.signature(value).bind(**field.arguments)
+            except TypeError:
+                raise GraphqlError(f"Unexpected arguments of field '{field.name}': {', '.join(field.arguments)}.")
+            value = value(**field.arguments)
+        elif field.arguments:
+            raise GraphqlError(f"Field '{field.name}' doesn't accept arguments.")
+        return self.graphql_complete(value, field)
+
+    def graphql_complete(self, value, field):
+        if isinstance(value, list):
+            return [self.graphql_complete(item, field) for item in value]
+        if isinstance(value, dict):
+            if not field.selections:
+                raise GraphqlError(f"Field '{field.name}' of type '{value['__typename']}' must have a selection of "
+                                   f"subfields.")
+            return {selection.alias: self.graphql_resolve(value, selection) for selection in field.selections}
+        if field.selections:
+            raise GraphqlError(f"Selections can't be made on scalars (field '{field.name}').")
+        return value
+
+    @staticmethod
+    def graphql_connection(type_name, items, first, node):
+        if not isinstance(first, int) or not 1 <= first <= GRAPHQL_MAX_FIRST:
+            raise GraphqlError(f"Requesting {first} records on the connection exceeds the `first` limit of "
+                               f"{GRAPHQL_MAX_FIRST} records.")
+        return {"__typename": f"{type_name}Connection", "totalCount": len(items),
+                "nodes": lambda: [node(item) for item in items[:first]]}
+
+    def graphql_root(self):
+
+        def user(login):
+            # As on GitHub, user(login:) does not resolve organizations.
+            user_id = self.dataset.user_id(login)
+            if user_id is None or self.dataset.user_type[user_id]:
+                raise GraphqlNotFound(f"Could not resolve to a User with the login of '{login}'.")
+            return self.graphql_user(user_id)
+
+        def repository(owner, name):
+            repo_id = self.dataset.repo_id(owner, name)
+            if repo_id is None or self.dataset.private[repo_id]:
+                raise GraphqlNotFound(f"Could not resolve to a Repository with the name '{owner}/{name}'.")
+            return self.graphql_repository(repo_id)
+
+        return {"__typename": "Query", "user": user, "repository": repository}
+
+    def graphql_user(self, user_id):
+        profile = self.user_profile(user_id)
+
+        def repositories(first, privacy=None, ownerAffiliations=None, orderBy=None):
+            # Public repositories owned by the user, in the order of the REST endpoint whatever the orderBy.
+            if privacy not in (None, "PUBLIC") or ownerAffiliations not in (None, ["OWNER"], "OWNER"):
+                raise GraphqlError("The stand-in only lists the public repositories owned by the user.")
+            return self.graphql_connection("Repository", self.public_repo_ids(user_id), first,
+                                           self.graphql_repository)
+
+        return {
+            "__typename": profile["type"], "databaseId": profile["id"], "login": profile["login"],
+            "name": profile["name"], "company": profile["company"], "location": profile["location"],
+            "email": profile["email"], "bio": profile["bio"], "url": profile["html_url"],
+            "createdAt": profile["created_at"],
+            "followers": lambda first: self.graphql_connection("Follower", self.follower_ids(user_id), first,
+                                                               self.graphql_user),
+            "repositories": repositories,
+        }
+
+    def graphql_repository(self, repo_id):
+        repository = self.repository(repo_id)
+
+        def issues(first, states=None, orderBy=None):
+            # Every issue of the stand-in is open, in the order of the REST endpoint whatever the orderBy.
+            labels = self.issue_labels(repo_id) if states in (None, "OPEN", ["OPEN"]) else []
+            return self.graphql_connection("Issue", list(enumerate(labels, 1)), first, lambda issue: self.graphql_issue(
+                self.issue(repo_id, repository["full_name"], *issue)))
+
+        return {
+            "__typename": "Repository", "databaseId": repository["id"], "name": repository["name"],
+            "nameWithOwner": repository["full_name"], "description": repository["description"],
+            "url": repository["html_url"], "isPrivate": repository["private"], "isArchived": repository["archived"],
+            "stargazerCount": repository["stargazers_count"], "forkCount": repository["forks_count"],
+            "createdAt": repository["created_at"], "pushedAt": repository["pushed_at"],
+            "primaryLanguage": {"__typename": "Language", "name": repository["language"]},
+            "issues": issues,
+        }
+
+    def graphql_issue(self, issue):
+        return {
+            "__typename": "Issue", "databaseId": issue["id"], "number": issue["number"], "title": issue["title"],
+            "state": issue["state"].upper(), "url": issue["html_url"],
+            "labels": lambda first: self.graphql_connection("Label", issue["labels"], first, lambda label: {
+                "__typename": "Label", "name": label["name"]}),
+        }
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, dataset, rate_limits=None, readme_padding=0, verbose=False, compression=True,
+                 tokens=None, faults=None):
+        super().__init__(address, StandInHandler)
+        self.faults = faults or Faults()
+        # Accepted tokens, the others get 401; None accepts any token.
+        self.tokens = set(tokens) if tokens is not None else None
+        self.dataset = dataset
+        self.rate_limits = rate_limits or RateLimits()
+        self.readme_padding = readme_padding
+        self.verbose = verbose
+        self.compression = compression
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start(port=0, host="127.0.0.1", dataset=None, unlimited=True, readme_padding=0, compression=True, tokens=None,
+          faults=None, limits=None, **dataset_options):
+    # Starts a stand-in server in a background thread (e.g. from a test session) and returns it.
+    # limits: {resource: (authenticated, anonymous, window)} replacing some of RATE_LIMITS.
+    server = StandInServer((host, port), dataset or Dataset(**dataset_options), RateLimits(limits, unlimited),
+                           readme_padding, compression=compression, tokens=tokens, faults=faults)
+    threading.Thread(target=server.serve_forever, name="github-stand-in", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in server for the GitHub search API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--repos", type=int, default=1_000_000, help="Number of synthetic repositories.")
+    parser.add_argument("--users", type=int, default=500_000, help="Number of synthetic users.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--unlimited", action="store_true", help="Send the rate limit headers but never enforce them.")
+    parser.add_argument("--readme-padding", type=int, default=0, help="Maximum extra bytes added to the READMEs.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes serving the same socket; the dataset is built once and shared.")
+    parser.add_argument("--no-compression", action="store_true",
+                        help="Never compress the responses (gzip, or brotli when installed, by default).")
+    parser.add_argument("--tokens", help="Comma-separated accepted tokens, the others get 401 (default: any token).")
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="Fraction of the searches that stall for --stall-seconds before answering.")
+    parser.add_argument("--stall-seconds", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of the searches answered with a 502.")
+    parser.add_argument("--incomplete-rate", type=float, default=0.0,
+                        help='Fraction of the searches answered with half a page and "incomplete_results": true.')
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    options = parser.parse_args()
+
+    dataset = Dataset(options.repos, options.users, options.seed)
+    print(f"Dataset: {dataset.repo_count} repositories, {dataset.user_count} users, "
+          f"built in {dataset.build_time:.1f}s")
+    server = StandInServer((options.host, options.port), dataset, RateLimits(unlimited=options.unlimited),
+                           options.readme_padding, options.verbose, not options.no_compression,
+                           options.tokens.split(",") if options.tokens else None,
+                           Faults(options.stall_rate, options.stall_seconds, options.error_rate,
+                                  options.incomplete_rate, options.seed))
+    print(f"Serving on {server.url} (raw files on {server.url}/raw) with {options.workers} worker(s)")
+    # The workers are forked after the indexes are built, so they share them (the rate limits are per worker).
+    for _ in range(options.workers - 1):
+        if os.fork() == 0:
+            break
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
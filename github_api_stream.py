@@ -0,0 +1,132 @@
+import codecs
+import json
+
+# Incremental parsing of search responses.
+# The body is decoded while it is downloaded: the values before "items" (total_count, incomplete_results) are kept
+# in "meta", then the items are decoded one at a time and reduced to the requested fields. Only the current item and
+# one chunk are held in memory, whatever the page size, and a caller that stops iterating stops the download.
+
+CHUNK_SIZE = 16 * 1024
+WHITESPACE = " \t\n\r"
+DECODER = json.JSONDecoder()
+
+
+def project(item, fields):
+    # Keeps only the dotted paths of "fields" (e.g. "owner.login"), with the same nesting as the item.
+    if fields is None:
+        return item
+    result = {}
+    for field in fields:
+        source, target = item, result
+        parts = field.split(".")
+        for part in parts[:-1]:
+            source = source.get(part)
+            if not isinstance(source, dict):
+                # e.g. "license" is null: keep the null, there is nothing below it.
+                target[part] = source
+                break
+            target = target.setdefault(part, {})
+        else:
+            if parts[-1] in source:
+                target[parts[-1]] = source[parts[-1]]
+    return result
+
+
+def response_contains(response, term, chunk_size=CHUNK_SIZE):
+    # Case-insensitive search of a term in a streamed UTF-8 body. The chunks are decoded incrementally, so a character
+    # cut between two chunks is whole again, and the end of every chunk is kept so a term cut between two chunks is
+    # still found. The download stops (the response is closed) as soon as it is.
+    term = (term.decode() if isinstance(term, bytes) else term).lower()
+    keep = len(term) - 1
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tail = ""
+    try:
+        for chunk in response.iter_content(chunk_size):
+            window = tail + decoder.decode(chunk).lower()
+            if term in window:
+                return True
+            tail = window[-keep:] if keep else ""
+    finally:
+        response.close()
+    return False
+
+
+class ItemStream:
+
+    def __init__(self, chunks, fields=None, items_key="items"):
+        self.chunks = iter(chunks)
+        self.fields = fields
+        self.items_key = items_key
+        self.meta = {}
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.finished = False
+
+    @classmethod
+    def from_response(cls, response, fields=None, items_key="items"):
+        return cls(response.iter_content(CHUNK_SIZE), fields, items_key)
+
+    def fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            if self.finished:
+                raise ValueError("Unexpected end of the JSON document.")
+            self.finished = True
+            text = self.decoder.decode(b"", final=True)
+        else:
+            text = self.decoder.decode(chunk)
+        # The text already parsed is dropped, so the buffer never holds more than the current value.
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at {char!r} in the JSON document.")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                self.fill()
+                continue
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and isinstance(value, (int, float)) and not self.finished:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def __iter__(self):
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            if key == self.items_key:
+                self.expect("[")
+                if self.peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield project(self.value(), self.fields)
+                        if self.expect(",]") == "]":
+                            break
+            else:
+                self.meta[key] = self.value()
+            if self.expect(",}") == "}":
+                return
@@ -0,0 +1,208 @@
+import html
+import json
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import github_api_client
+
+# Per-request timing of the shared client.
+# The RequestTimer layer sits next to the transport and records, for every request that reaches the network, the
+# DNS, TCP connect, TLS handshake, time to first byte and download phases, the bytes on the wire, the status, the
+# remaining rate limit and the test that sent it. The connection phases are measured by urllib3 connection classes
+# that install() puts on the client's pools; a reused keep-alive connection has none. Nothing is installed when
+# timing is off, so the client then runs exactly as before.
+
+PHASES = ("dns", "connect", "tls", "ttfb", "download")
+
+# Phases of the request being sent by the current thread, filled in by the connection classes.
+_current = threading.local()
+
+
+def current_phases():
+    return getattr(_current, "phases", None)
+
+
+class TimedConnectionMixin:
+
+    def _new_conn(self):
+        phases = current_phases()
+        if phases is None:
+            return super()._new_conn()
+        # The name is resolved here so DNS and TCP connect are measured apart, the connection then uses the address.
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            # Let urllib3 raise its usual error.
+            address = host
+        resolved = time.perf_counter()
+        self._dns_host = address
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        phases["dns"] += resolved - started
+        phases["connect"] += time.perf_counter() - resolved
+        return sock
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        phases = current_phases()
+        if phases is None:
+            return super().connect()
+        started = time.perf_counter()
+        before = phases["dns"] + phases["connect"]
+        super().connect()
+        # Whatever connect() spent beyond the socket connection is the TLS handshake.
+        phases["tls"] += time.perf_counter() - started - (phases["dns"] + phases["connect"] - before)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+def install(client):
+    # The pools already open keep their connections, the new ones use the timed connection classes.
+    for adapter in set(client.session.adapters.values()):
+        adapter.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                      "https": TimedHTTPSConnectionPool}
+        adapter.poolmanager.clear()
+
+
+def uninstall(client):
+    for adapter in set(client.session.adapters.values()):
+        adapter.poolmanager.pool_classes_by_scheme = {"http": HTTPConnectionPool, "https": HTTPSConnectionPool}
+        adapter.poolmanager.clear()
+
+
+def header_bytes(headers):
+    return sum(len(name) + len(value) + 4 for name, value in headers.items())
+
+
+class RequestTimer:
+    order = 70
+
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.records = []
+        self.lock = threading.Lock()
+
+    def __call__(self, request, send, **kwargs):
+        stream = kwargs.get("stream", False)
+        kwargs["stream"] = True
+        phases = dict.fromkeys(PHASES, 0.0)
+        _current.phases = phases
+        started = time.perf_counter()
+        try:
+            response = send(request, **kwargs)
+        finally:
+            _current.phases = None
+        headers_at = time.perf_counter()
+        phases["ttfb"] = headers_at - started - phases["dns"] - phases["connect"] - phases["tls"]
+
+        url = urlsplit(request.url)
+        record = {
+            "test": github_api_client.current_test(), "method": request.method, "host": url.netloc, "path": url.path,
+            "url": request.url, "status": response.status_code, "started": time.time() - (headers_at - started),
+            "reused_connection": phases["connect"] == 0,
+            "rate_limit_remaining": response.headers.get("X-RateLimit-Remaining"),
+            "bytes_sent": len(f"{request.method} {request.path_url} HTTP/1.1\r\n") + header_bytes(request.headers) +
+                          len(request.body or b""),
+            "bytes_received": None,
+        }
+        with self.lock:
+            self.records.append(record)
+
+        def finish():
+            # The body is downloaded by the time the response is closed (or read, without streaming).
+            if "download" in record:
+                return
+            phases["download"] = time.perf_counter() - headers_at
+            record["bytes_received"] = response.raw.tell() + header_bytes(response.headers) + \
+                len(f"HTTP/1.1 {response.status_code} {response.reason}\r\n")
+            record.update({phase: round(phases[phase] * 1000, 3) for phase in PHASES})
+            record["total"] = round(sum(phases.values()) * 1000, 3)
+
+        if not stream:
+            response.content
+            finish()
+        else:
+            close = response.close
+
+            def timed_close():
+                finish()
+                close()
+
+            response.close = timed_close
+        return response
+
+    def finished(self):
+        with self.lock:
+            return [record for record in self.records if "total" in record]
+
+    def groups(self):
+        # (test, host + path) -> {phase: total ms, "count": requests}, in the order of the first request.
+        groups = defaultdict(lambda: dict(dict.fromkeys(PHASES, 0.0), count=0, bytes=0))
+        for record in self.finished():
+            group = groups[(record["test"], record["host"] + record["path"])]
+            group["count"] += 1
+            group["bytes"] += record["bytes_received"]
+            for phase in PHASES:
+                group[phase] += record[phase]
+        return groups
+
+    def write(self):
+        if not self.trace_path:
+            return
+        with open(self.trace_path, "w") as trace_file:
+            json.dump({"requests": self.finished()}, trace_file, indent=1)
+
+    def summary(self):
+        records = self.finished()
+        totals = {phase: sum(record[phase] for record in records) for phase in PHASES}
+        new = sum(1 for record in records if not record["reused_connection"])
+        trace = f", trace in {self.trace_path}" if self.trace_path else ""
+        return (f"timing: {len(records)} requests ({new} new connections), "
+                + ", ".join(f"{phase} {total / 1000:.2f}s" for phase, total in totals.items()) + trace)
+
+    def html_table(self):
+        # Flame-style table: one row per test and endpoint, with a bar of its phases scaled to the slowest row.
+        groups = self.groups()
+        longest = max((sum(group[phase] for phase in PHASES) for group in groups.values()), default=0) or 1
+        colors = {"dns": "#8e44ad", "connect": "#2980b9", "tls": "#16a085", "ttfb": "#e67e22", "download": "#c0392b"}
+        legend = " ".join(f'<span style="color:{colors[phase]}">&#9632; {phase}</span>' for phase in PHASES)
+        rows = []
+        for (test, endpoint), group in groups.items():
+            total = sum(group[phase] for phase in PHASES)
+            bar = "".join(
+                f'<span title="{phase} {group[phase]:.1f} ms" style="display:inline-block;height:12px;'
+                f'width:{group[phase] / longest * 300:.1f}px;background:{colors[phase]}"></span>'
+                for phase in PHASES)
+            cells = [html.escape(test.rsplit("::", 1)[-1]), html.escape(endpoint), str(group["count"])]
+            cells += [f"{group[phase]:.1f}" for phase in PHASES]
+            cells += [f"{total:.1f}", str(group["bytes"]), f'<div style="width:300px">{bar}</div>']
+            rows.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+        header = "".join(f"<th>{name}</th>" for name in
+                         ["Test", "Endpoint", "Requests"] + [f"{phase} (ms)" for phase in PHASES] +
+                         ["Total (ms)", "Bytes", "Phases"])
+        return f"<h2>Request timing</h2><p>{legend}</p><table><tr>{header}</tr>{''.join(rows)}</table>"
+
+    def close(self):
+        self.write()
@@ -0,0 +1,143 @@
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+import github_api_client
+import github_api_ratelimit
+
+# Token pool for the shared client (GH_TOKENS="token1,token2,...").
+# Every authenticated request is sent with the token that has the most quota left for its resource (search,
+# code_search, core, ...), as told by the X-RateLimit-* headers of its previous responses; tokens not used yet count
+# as full. A token answered with 401 is retired. A 403 that is not a rate limit retires the token only when another
+# token then succeeds on the same request (otherwise the request itself is forbidden). Each pytest-xdist worker starts
+# from a different token so the workers spread over the pool. The layer runs before the rate limiter, whose buckets
+# are per token, so the throughput grows with the number of tokens.
+# A rate limited token is skipped: the tokens the limiter still blocks are picked last, and a rate limit response is
+# sent again with another token (the limiter hands it up instead of waiting, see conftest). Once every token has
+# answered with a rate limit, the request goes to the token freed first and the limiter waits for it.
+
+
+def worker_index():
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "")
+    return int(worker[2:]) if worker.startswith("gw") and worker[2:].isdigit() else 0
+
+
+class TokenPool:
+    order = 45
+
+    def __init__(self, tokens, raw_url=None, limiter=None):
+        self.tokens = list(dict.fromkeys(token for token in tokens if token))
+        self.raw_root = github_api_ratelimit.raw_root(raw_url)
+        self.limiter = limiter
+        self.lock = threading.Lock()
+        self.turn = worker_index()
+        # (token, resource) -> (remaining, reset)
+        self.quota = {}
+        self.retired = {}
+        self.usage = Counter()
+        # Rate limit responses sent again with another token.
+        self.rotations = 0
+
+    @staticmethod
+    def name(token):
+        return github_api_client.authorization_id(f"token {token}")
+
+    def choose(self, resource, exclude=()):
+        # The active token free the soonest (now unless the rate limiter blocks it), then with the most quota left,
+        # the ties taken in turn from this worker's starting point.
+        blocked = {}
+        if self.limiter is not None:
+            blocked = {token: self.limiter.blocked_for(github_api_ratelimit.bucket_key(resource, self.name(token)))
+                       for token in self.tokens if token not in exclude}
+        now = time.time()
+        with self.lock:
+            active = [token for token in self.tokens if token not in self.retired and token not in exclude]
+            if not active:
+                return None
+            self.turn += 1
+
+            def left(position):
+                remaining, reset = self.quota.get((active[position], resource), (None, 0))
+                return math.inf if remaining is None or now >= reset else remaining
+
+            position = max(range(len(active)), key=lambda position: (
+                -blocked.get(active[position], 0.0), left(position), -((position - self.turn) % len(active))))
+            token = active[position]
+            remaining, reset = self.quota.get((token, resource), (None, 0))
+            if remaining is not None and now < reset:
+                # Counted before the response arrives so concurrent requests spread over the tokens.
+                self.quota[(token, resource)] = (remaining - 1, reset)
+            self.usage[(token, resource)] += 1
+            return token
+
+    def update(self, token, resource, response):
+        headers = response.headers
+        if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+            with self.lock:
+                self.quota[(token, resource)] = (int(headers["X-RateLimit-Remaining"]),
+                                                 int(headers["X-RateLimit-Reset"]))
+
+    def retire(self, token, reason):
+        with self.lock:
+            self.retired.setdefault(token, reason)
+
+    def __call__(self, request, send, **kwargs):
+        if "Authorization" not in request.headers or not self.tokens:
+            return send(request, **kwargs)
+
+        resource = github_api_ratelimit.resource_of(request.url, self.raw_root)
+        tried = []
+        forbidden = []
+        limited = []
+        rounds = 0
+        response = None
+        while True:
+            token = self.choose(resource, exclude=tried)
+            if token is None and limited and self.limiter is not None and rounds < github_api_ratelimit.MAX_RETRIES:
+                # Every token is rate limited: the first one freed is tried again, after the limiter's wait.
+                rounds += 1
+                tried = [token for token in tried if token not in limited]
+                limited = []
+                continue
+            if token is None:
+                if response is None:
+                    raise RuntimeError("Every token of the pool was retired: "
+                                       + ", ".join(f"{self.name(token)} ({reason})"
+                                                   for token, reason in self.retired.items()))
+                return response
+            if response is not None:
+                response.close()
+            tried.append(token)
+            request.headers["Authorization"] = f"token {token}"
+            response = send(request, **kwargs)
+            self.update(token, resource, response)
+
+            if response.status_code == 401:
+                self.retire(token, "401 bad credentials")
+            elif github_api_ratelimit.rate_limited(response):
+                # Exhausted for now, not broken: another token may still have quota.
+                limited.append(token)
+                with self.lock:
+                    self.rotations += 1
+                continue
+            elif response.status_code == 403:
+                forbidden.append(token)
+            else:
+                for token in forbidden:
+                    self.retire(token, "403 forbidden")
+                return response
+
+    def summary(self):
+        lines = [f"token pool: {len(self.tokens)} tokens, {len(self.retired)} retired, "
+                 f"{self.rotations} rate limit responses sent again with another token"]
+        now = time.time()
+        for token in self.tokens:
+            used = ", ".join(f"{resource} {count}" for (used_token, resource), count in sorted(self.usage.items())
+                             if used_token == token) or "unused"
+            left = ", ".join(f"{resource} {remaining}" for (quota_token, resource), (remaining, reset)
+                             in sorted(self.quota.items()) if quota_token == token and reset > now)
+            state = f"retired: {self.retired[token]}" if token in self.retired else "active"
+            lines.append(f"  {self.name(token)}: {used}" + (f"; remaining {left}" if left else "") + f" ({state})")
+        return "\n".join(lines)
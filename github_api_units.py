@@ -0,0 +1,645 @@
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+import github_api_cache
+import github_api_cassette
+import github_api_client
+import github_api_coalesce
+import github_api_columns
+import github_api_graphql
+import github_api_latency
+import github_api_load
+import github_api_ratelimit
+import github_api_records
+import github_api_server
+import github_api_stream
+import github_api_tokens
+
+# Offline tests of the client's building blocks: parsers, keys and histograms, checked without any server.
+#
+#   pytest github_api_units.py
+
+
+class ChunkedResponse:
+    # Stand-in for a streamed requests.Response: the body is served in the given chunks.
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.served = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size=None):
+        for chunk in self.chunks:
+            self.served += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def split_at(data, *positions):
+    bounds = [0, *positions, len(data)]
+    return [data[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+class ItemStreamTests(unittest.TestCase):
+    DOCUMENT = {
+        "total_count": 12345,
+        "incomplete_results": False,
+        "items": [
+            {"name": 'quote " and backslash \\ end', "owner": {"login": "voorloopnul"}, "score": 1.5},
+            {"name": "café 日本 \U0001F600", "owner": None, "score": 0.25},
+            {"name": "escapes \n \t \u0001 /", "owner": {"login": "renataberoli"}, "score": 10},
+        ],
+        "after": [1, 2, 3],
+    }
+
+    def parse(self, chunks, fields=None):
+        stream = github_api_stream.ItemStream(chunks, fields)
+        return list(stream), stream.meta
+
+    def assertParsesAtEveryBoundary(self, body):
+        expected = json.loads(body)
+        items = expected.pop("items")
+        for position in range(1, len(body)):
+            with self.subTest(position=position, around=body[max(0, position - 5):position + 5]):
+                self.assertEqual((items, expected), self.parse(split_at(body, position)))
+
+    def test_split_anywhere_with_ascii_escapes(self):
+        # json.dumps escapes every non-ASCII character (\u00e9, surrogate pairs) as well as \" and \\, so the
+        # boundaries fall inside each kind of escape.
+        self.assertParsesAtEveryBoundary(json.dumps(self.DOCUMENT).encode())
+
+    def test_split_anywhere_in_utf8_characters(self):
+        # Raw UTF-8: the boundaries fall inside two, three and four byte characters.
+        body = json.dumps(self.DOCUMENT, ensure_ascii=False).encode()
+        self.assertGreater(len(body), len(json.dumps(self.DOCUMENT, ensure_ascii=False)))
+        self.assertParsesAtEveryBoundary(body)
+
+    def test_one_byte_chunks(self):
+        body = json.dumps(self.DOCUMENT, ensure_ascii=False, indent=2).encode()
+        items, meta = self.parse([body[index:index + 1] for index in range(len(body))])
+        self.assertEqual(self.DOCUMENT["items"], items)
+        self.assertEqual({"total_count": 12345, "incomplete_results": False, "after": [1, 2, 3]}, meta)
+
+    def test_number_cut_at_the_end_of_a_chunk(self):
+        body = b'{"total_count": 12345, "items": [1234, 5.75]}'
+        self.assertEqual(([1234, 5.75], {"total_count": 12345}),
+                         self.parse(split_at(body, body.index(b"23"), body.index(b".75"))))
+
+    def test_fields_keep_the_nesting_and_null_parents(self):
+        items, _ = self.parse([json.dumps(self.DOCUMENT).encode()], ["owner.login", "score"])
+        self.assertEqual([{"owner": {"login": "voorloopnul"}, "score": 1.5}, {"owner": None, "score": 0.25},
+                          {"owner": {"login": "renataberoli"}, "score": 10}], items)
+
+    def test_empty_items(self):
+        self.assertEqual(([], {"total_count": 0}), self.parse([b'{"total_count": 0, "items": []}']))
+        self.assertEqual(([], {}), self.parse([b"{}"]))
+
+    def test_truncated_document(self):
+        body = json.dumps(self.DOCUMENT).encode()
+        for end in (len(body) // 2, len(body) - 1, body.index(b'\\"')):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                self.parse([body[:end]])
+
+    def test_stopping_early_reads_no_further(self):
+        body = json.dumps(self.DOCUMENT).encode()
+        chunks = [body[index:index + 16] for index in range(0, len(body), 16)]
+        stream = github_api_stream.ItemStream(iter(chunks))
+        consumed = []
+        for item in stream:
+            consumed.append(item)
+            break
+        self.assertEqual([self.DOCUMENT["items"][0]], consumed)
+        self.assertLess(len(stream.buffer), len(body))
+
+
+class ResponseContainsTests(unittest.TestCase):
+
+    def test_term_cut_anywhere(self):
+        body = b"# tesla-client\n\nClient for the Tesla API.\n"
+        for position in range(1, len(body)):
+            with self.subTest(position=position):
+                response = ChunkedResponse(split_at(body, position))
+                self.assertTrue(github_api_stream.response_contains(response, "TESLA API"))
+                self.assertTrue(response.closed)
+
+    def test_non_ascii_term_cut_inside_a_character(self):
+        body = "Notes sur la Bactériophagie et le café \U0001F9EC".encode()
+        for term in ("bactériophagie", "BACTÉRIOPHAGIE", "café \U0001F9EC"):
+            for position in range(1, len(body)):
+                with self.subTest(term=term, position=position):
+                    response = ChunkedResponse(split_at(body, position))
+                    self.assertTrue(github_api_stream.response_contains(response, term))
+
+    def test_bytes_term(self):
+        self.assertTrue(github_api_stream.response_contains(ChunkedResponse([b"ab", b"cd"]), b"BC"))
+
+    def test_stops_at_the_first_match(self):
+        response = ChunkedResponse([b"phage ", b"therapy ", b"notes ", b"more"])
+        self.assertTrue(github_api_stream.response_contains(response, "therapy"))
+        self.assertEqual(2, response.served)
+        self.assertTrue(response.closed)
+
+    def test_missing_term(self):
+        response = ChunkedResponse([b"python ", b"tool"])
+        self.assertFalse(github_api_stream.response_contains(response, "tesla"))
+        self.assertTrue(response.closed)
+
+
+class OffendersTests(unittest.TestCase):
+    ITEMS = [
+        {"name": "python-tool", "description": "A Python tool", "size": 50, "stargazers_count": 10,
+         "created_at": "2020-05-01T10:00:00Z", "language": "Python", "owner": {"login": "voorloopnul"},
+         "topics": ["python", "cli"], "archived": False, "mirror_url": None, "license": {"key": "mit"}},
+        {"name": "tesla-api", "description": None, "size": 150, "stargazers_count": 0,
+         "created_at": "2021-01-01T00:00:00Z", "language": "Go", "owner": {"login": "renataberoli"},
+         "topics": [], "archived": True, "mirror_url": "https://mirror.example.org/x.git", "license": None},
+        {"name": "no-values", "description": "python", "size": None, "stargazers_count": None,
+         "created_at": None, "language": None, "owner": None, "topics": None, "archived": None,
+         "mirror_url": None, "license": None},
+    ]
+
+    def assertOffenders(self, qualifier, indexes):
+        self.assertEqual(indexes, [index for index, _ in github_api_columns.offenders(self.ITEMS, qualifier)])
+
+    def test_ranges(self):
+        self.assertOffenders("size:<=100", [1, 2])
+        self.assertOffenders("size:<100", [1, 2])
+        self.assertOffenders("size:>50", [0, 2])
+        self.assertOffenders("size:>=50", [2])
+        self.assertOffenders("size:50", [1, 2])
+        self.assertOffenders("size:40..100", [1, 2])
+        self.assertOffenders("size:*..100", [1, 2])
+        self.assertOffenders("stars:1..*", [1, 2])
+
+    def test_missing_values_are_offenders(self):
+        # Whatever the condition, an item without the value cannot be shown to match it.
+        for qualifier in ("size:>=0", "size:*..*", "stars:<=1000000", "created:>=1970-01-01", "topics:>=0"):
+            with self.subTest(qualifier=qualifier):
+                self.assertIn(2, [index for index, _ in github_api_columns.offenders(self.ITEMS, qualifier)])
+
+    def test_dates_compare_days(self):
+        self.assertOffenders("created:<=2020-05-01", [1, 2])
+        self.assertOffenders("created:2020-01-01..2020-12-31", [1, 2])
+        self.assertOffenders("created:>2020-05-01", [0, 2])
+
+    def test_text_and_lists(self):
+        self.assertOffenders("language:python", [1, 2])
+        self.assertOffenders("license:mit", [1, 2])
+        self.assertOffenders("user:VoorloopNul", [1, 2])
+        self.assertOffenders("topic:cli", [1, 2])
+        self.assertOffenders("topics:>=1", [1, 2])
+        self.assertOffenders("python in:description", [1])
+        self.assertOffenders("python in:name", [1, 2])
+
+    def test_flags(self):
+        self.assertOffenders("archived:true", [0, 2])
+        self.assertOffenders("archived:false", [1])
+        self.assertOffenders("mirror:true", [0, 2])
+
+    def test_records_give_the_same_offenders(self):
+        records = [github_api_records.Repository.from_item(item) for item in self.ITEMS]
+        for qualifier in ("size:<=100", "created:>2020-05-01", "topic:cli", "user:renataberoli", "mirror:false"):
+            with self.subTest(qualifier=qualifier):
+                # Records hold the lists as tuples, the offending indexes are the same.
+                self.assertEqual([index for index, _ in github_api_columns.offenders(self.ITEMS, qualifier)],
+                                 [index for index, _ in github_api_columns.offenders(records, qualifier)])
+
+    def test_offenders_keep_the_values(self):
+        self.assertEqual([(1, 150), (2, None)], github_api_columns.offenders(self.ITEMS, "size:<=100"))
+        self.assertEqual([], github_api_columns.offenders([], "size:<=100"))
+
+    def test_message_is_limited(self):
+        failed = [(index, index * 10) for index in range(60)]
+        message = github_api_columns.offenders_message("size:<=5", failed)
+        self.assertIn("(60)", message)
+        self.assertIn("[49] 490", message)
+        self.assertNotIn("[50] 500", message)
+        self.assertTrue(message.endswith("and 10 more"))
+
+
+class NormalizeQueryTests(unittest.TestCase):
+
+    def assertSameKey(self, first, second):
+        self.assertEqual(github_api_coalesce.normalize_query(first), github_api_coalesce.normalize_query(second))
+
+    def assertDifferentKeys(self, first, second):
+        self.assertNotEqual(github_api_coalesce.normalize_query(first), github_api_coalesce.normalize_query(second))
+
+    def test_parameters_and_qualifiers_are_sorted(self):
+        self.assertSameKey("q=python+user:x&per_page=5", "per_page=5&q=user:x+python")
+        self.assertSameKey("q=Mark_II+in:description+user:renataberoli+followers:1",
+                           "q=Mark_II+followers:1+user:renataberoli+in:description")
+        self.assertSameKey('q=python+label:"good first issue"+stars:>10', 'q=stars:>10+python+label:"good first issue"')
+
+    def test_keywords_and_operators_keep_their_order(self):
+        self.assertDifferentKeys("q=python+NOT+java", "q=java+NOT+python")
+        self.assertDifferentKeys("q=python+OR+java+tesla", "q=tesla+OR+java+python")
+        self.assertDifferentKeys('q="phage therapy"+notes', 'q=notes+"phage therapy"')
+        self.assertSameKey("q=python+NOT+java+stars:>5+user:x", "q=user:x+python+NOT+java+stars:>5")
+
+    def test_qualifier_next_to_an_operator_stays_in_place(self):
+        self.assertDifferentKeys("q=python+NOT+language:go+user:x", "q=python+user:x+NOT+language:go")
+        self.assertEqual("q=python+NOT+language%3Ago+stars%3A%3E1",
+                         github_api_coalesce.normalize_query("q=stars:>1+python+NOT+language:go"))
+
+    def test_other_parameters_are_untouched(self):
+        self.assertEqual("page=2&q=b+a", github_api_coalesce.normalize_query("q=b+a&page=2"))
+        self.assertEqual("empty=&q=", github_api_coalesce.normalize_query("q=&empty="))
+
+
+class HistogramTests(unittest.TestCase):
+    Histogram = github_api_load.Histogram
+    # Every value up to a few buckets past the exact range, then around each power of two up to an hour.
+    VALUES = list(range(4096)) + sorted({2 ** power + delta for power in range(12, 32) for delta in (-1, 0, 1)})
+
+    def test_small_values_are_exact(self):
+        for value in range(2 * self.Histogram.HALF):
+            self.assertEqual(value, self.Histogram.index(value))
+            self.assertEqual(value, self.Histogram.highest_equivalent(value))
+
+    def test_buckets_are_contiguous_and_ordered(self):
+        # The highest value of a bucket is followed by the first value of the next one.
+        for index in range(self.Histogram.index(2 ** 31)):
+            highest = self.Histogram.highest_equivalent(index)
+            with self.subTest(index=index):
+                self.assertEqual(index, self.Histogram.index(highest))
+                self.assertEqual(index + 1, self.Histogram.index(highest + 1))
+
+    def test_two_significant_digits(self):
+        for value in self.VALUES:
+            highest = self.Histogram.highest_equivalent(self.Histogram.index(value))
+            with self.subTest(value=value):
+                self.assertGreaterEqual(highest, value)
+                self.assertLess(highest - value, max(1, value / self.Histogram.HALF))
+
+    def test_percentiles(self):
+        histogram = self.Histogram()
+        for millisecond in range(1, 1001):
+            histogram.record(millisecond / 1000)
+        self.assertEqual(1000, histogram.total)
+        for percentile, expected in ((50, 0.5), (90, 0.9), (99, 0.99), (100, 1.0)):
+            with self.subTest(percentile=percentile):
+                self.assertGreaterEqual(histogram.percentile(percentile), expected)
+                self.assertLess(histogram.percentile(percentile), expected * (1 + 1 / self.Histogram.HALF))
+
+    def test_percentile_never_exceeds_the_max(self):
+        histogram = self.Histogram()
+        histogram.record(0.123457)
+        self.assertEqual(0.123457, histogram.percentile(99.9))
+        self.assertEqual(0.0, self.Histogram().percentile(50))
+
+    def test_values_are_clamped(self):
+        histogram = self.Histogram(highest=1_000_000)
+        histogram.record(-1)
+        histogram.record(5)
+        self.assertEqual(2, histogram.total)
+        self.assertEqual(1_000_000, histogram.max)
+        self.assertEqual(1, histogram.counts[0])
+
+
+class GraphqlParserTests(unittest.TestCase):
+    # The stand-in's parser of the GraphQL subset the batches send.
+
+    class Client:
+        base_url = "https://api.github.com"
+
+        def url(self, url):
+            return url
+
+    def parse(self, text):
+        return github_api_server.GraphqlParser(text).document()
+
+    def test_batch_query(self):
+        batch = github_api_graphql.GraphqlBatch(self.Client())
+        batch.add("https://api.github.com/users/renataberoli/repos", None)
+        batch.add("https://api.github.com/users/renataberoli", None)
+        batch.add('https://api.github.com/users/a"b', None)
+        query, keys = batch.query()
+        fields = self.parse(query)
+        self.assertEqual(["q0", "q1", "q2"], [field.alias for field in fields])
+        self.assertEqual(["user"] * 3, [field.name for field in fields])
+        self.assertEqual([{"login": arguments[0]} for _, arguments in keys], [field.arguments for field in fields])
+        repositories = fields[[kind for kind, _ in keys].index("repos")].selections[0]
+        self.assertEqual("repositories", repositories.name)
+        self.assertEqual({"first": 30, "privacy": "PUBLIC", "ownerAffiliations": ["OWNER"],
+                          "orderBy": {"field": "NAME", "direction": "ASC"}}, repositories.arguments)
+        nodes = repositories.selections[0]
+        self.assertEqual("nodes", nodes.name)
+        language = [field for field in nodes.selections if field.name == "primaryLanguage"][0]
+        self.assertEqual(["name"], [field.name for field in language.selections])
+        self.assertIsNone(nodes.selections[0].selections)
+
+    def test_values(self):
+        field, = self.parse('{ f(s: "a\\"\\u00e9", i: -3, x: 1.5, b: true, n: null, e: OPEN, '
+                            'l: [1, [2]], o: {k: "v"}) }')
+        self.assertEqual({"s": 'a"\u00e9', "i": -3, "x": 1.5, "b": True, "n": None, "e": "OPEN", "l": [1, [2]],
+                          "o": {"k": "v"}}, field.arguments)
+
+    def test_named_operation_commas_and_comments(self):
+        fields = self.parse('query Lookups {\n  # the first one\n  a: user(login: "x") { login },, b: viewer { id }\n}')
+        self.assertEqual([("a", "user"), ("b", "viewer")], [(field.alias, field.name) for field in fields])
+        self.assertEqual(["login"], [field.name for field in fields[0].selections])
+
+    def test_unsupported_or_malformed_queries(self):
+        for query in ("query($login: String!) { user(login: $login) { id } }", "{ user { ...Fields } }",
+                      "{ a } { b }", "{ user(login: \"x\") { id }", "{ user(login \"x\") { id } }", "{ 1 }", ""):
+            with self.subTest(query=query), self.assertRaises(github_api_server.GraphqlError):
+                self.parse(query)
+
+
+class GraphqlBatchTests(unittest.TestCase):
+
+    class Client:
+        base_url = "https://api.github.com"
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def url(self, url):
+            return url
+
+        def graphql(self, query):
+            request = requests.Request("POST", f"{self.base_url}/graphql").prepare()
+            return github_api_client.build_response(request, 200, "OK", {}, json.dumps(self.payload).encode())
+
+    USER = {"__typename": "User", "databaseId": 1, "login": "renataberoli", "name": None, "company": None,
+            "location": None, "email": None, "bio": None, "url": "https://github.com/renataberoli",
+            "createdAt": "2018-01-01T00:00:00Z"}
+
+    def test_not_found_falls_back_to_rest(self):
+        # GitHub's user(login:) does not resolve organizations, the REST endpoint does.
+        payload = {"data": {"q0": None, "q1": self.USER},
+                   "errors": [{"type": "NOT_FOUND", "path": ["q0"], "message": "Could not resolve to a User."}]}
+        batch = github_api_graphql.GraphqlBatch(self.Client(payload))
+        organization, user = Future(), Future()
+        batch.add("https://api.github.com/users/github", organization)
+        batch.add("https://api.github.com/users/renataberoli", user)
+        fallbacks = []
+        batch.send(lambda url, future: fallbacks.append(url))
+        self.assertEqual(["https://api.github.com/users/github"], fallbacks)
+        self.assertFalse(organization.done())
+        response = user.result(timeout=0)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("renataberoli", response.json()["login"])
+        self.assertEqual("https://api.github.com/users/renataberoli/repos", response.json()["repos_url"])
+
+    def test_failed_query_falls_back_to_rest(self):
+        batch = github_api_graphql.GraphqlBatch(self.Client({"message": "Bad credentials"}))
+        batch.add("https://api.github.com/users/renataberoli/followers", Future())
+        fallbacks = []
+        batch.send(lambda url, future: fallbacks.append(url))
+        self.assertEqual(["https://api.github.com/users/renataberoli/followers"], fallbacks)
+
+
+class CurrentTestTests(unittest.TestCase):
+
+    def test_requests_sent_ahead_are_charged_to_their_test(self):
+        running = "github_api_repo.py::GithubSearchTests::test_repo_search_by_name (call)"
+        with unittest.mock.patch.dict(os.environ, {"PYTEST_CURRENT_TEST": running}):
+            self.assertEqual(running[:-len(" (call)")], github_api_client.current_test())
+            with ThreadPoolExecutor(1) as executor:
+                sent_for = executor.submit(github_api_client.send_for, "github_api_user.py::T::test_a",
+                                           github_api_client.current_test)
+                self.assertEqual("github_api_user.py::T::test_a", sent_for.result())
+                session = executor.submit(github_api_client.send_for, None, github_api_client.current_test)
+                self.assertEqual(github_api_client.SESSION, session.result())
+                # The worker is back to the running test once the request is sent.
+                self.assertEqual(running[:-len(" (call)")], executor.submit(github_api_client.current_test).result())
+        with unittest.mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(github_api_client.SESSION, github_api_client.current_test())
+
+
+class TokenPoolTests(unittest.TestCase):
+    # Against an in-process stand-in that accepts two tokens and three searches per token and minute.
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = github_api_server.start(unlimited=False, tokens=["good1", "good2"],
+                                             limits={"search": (3, 1, 60)}, repos=2000, users=1000)
+        cls.addClassCleanup(cls.server.shutdown)
+        cls.addClassCleanup(cls.server.server_close)
+
+    def client(self, tokens, rate_limit=True):
+        client = github_api_client.GithubClient(self.server.url, self.server.url + "/raw", token=tokens[0])
+        self.addCleanup(client.session.close)
+        limiter = None
+        if rate_limit:
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            limiter = client.use(github_api_ratelimit.RateLimiter(os.path.join(directory.name, "buckets.json"),
+                                                                  client.raw_url, retry_rate_limited=False))
+        pool = client.use(github_api_tokens.TokenPool(tokens, client.raw_url, limiter))
+        return client, pool, limiter
+
+    def spend(self, token):
+        # Uses up the search quota of a token outside of the pool.
+        with requests.Session() as session:
+            for _ in range(3):
+                session.get(f"{self.server.url}/search/users?q=spent", headers={"Authorization": f"token {token}"})
+
+    def test_bad_token_is_retired(self):
+        client, pool, _ = self.client(["bad", "good1"], rate_limit=False)
+        for _ in range(2):
+            self.assertEqual(200, client.get("/users/renataberoli").status_code)
+        self.assertEqual({"bad": "401 bad credentials"}, pool.retired)
+        self.assertEqual(1, pool.usage[("bad", "core")])
+
+    def test_every_token_retired(self):
+        client, pool, _ = self.client(["bad", "worse"], rate_limit=False)
+        # The request that retires the last token gets its 401, the next one has no token left.
+        self.assertEqual(401, client.get("/users/renataberoli").status_code)
+        with self.assertRaisesRegex(RuntimeError, "Every token of the pool was retired"):
+            client.get("/users/renataberoli")
+
+    def test_rate_limited_token_is_skipped(self):
+        self.spend("good1")
+        client, pool, limiter = self.client(["good1", "good2"])
+        for _ in range(2):
+            self.assertEqual(200, client.search("repositories", "q=python").status_code)
+        # good1 answered once with a rate limit, handed up by the limiter instead of being retried, and is then
+        # picked last: its bucket is blocked until the reset.
+        self.assertEqual(1, pool.usage[("good1", "search")])
+        self.assertEqual(2, pool.usage[("good2", "search")])
+        self.assertEqual(1, pool.rotations)
+        self.assertEqual(0, limiter.retries)
+        self.assertGreater(limiter.blocked_for(github_api_ratelimit.bucket_key("search", pool.name("good1"))), 0)
+        self.assertEqual("good1", pool.choose("search", exclude=["good2"]))
+        self.assertEqual("good2", pool.choose("search"))
+
+
+class CassetteTests(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    @staticmethod
+    def request(path):
+        return requests.Request("GET", f"https://api.github.com{path}").prepare()
+
+    def record(self, *paths):
+        recorder = github_api_cassette.CassetteRecorder(self.directory)
+        for path in paths:
+            recorder(self.request(path), lambda request, **kwargs: github_api_client.build_response(
+                request, 200, "OK", {"Content-Type": "application/json"}, json.dumps({"path": path}).encode()))
+        # Left open, as by a killed recording: every record is already flushed.
+        self.addCleanup(recorder.close)
+        return recorder
+
+    def replay(self, path):
+        player = github_api_cassette.CassettePlayer(self.directory)
+        self.addCleanup(player.close)
+        return player(self.request(path), None).json()["path"]
+
+    def test_replays_an_unclosed_recording(self):
+        self.record("/users/a", "/users/b")
+        self.assertEqual("/users/b", self.replay("/users/b"))
+
+    def test_cut_index_line(self):
+        recorder = self.record("/users/a", "/users/b")
+        index_path = recorder.index_path
+        with open(index_path) as index_file:
+            lines = index_file.read().splitlines()
+        with open(index_path, "w") as index_file:
+            index_file.write(lines[0] + "\n" + lines[1][:len(lines[1]) // 2])
+        self.assertEqual("/users/a", self.replay("/users/a"))
+        with self.assertRaises(github_api_cassette.CassetteMissError):
+            self.replay("/users/b")
+
+    def test_index_entry_past_the_data(self):
+        # The index line of a record whose data did not reach the disk.
+        recorder = self.record("/users/a", "/users/b")
+        with open(recorder.index_path) as index_file:
+            first, second = [json.loads(line) for line in index_file]
+        _, offset, length = second
+        with open(recorder.data_path, "r+b") as data_file:
+            data_file.truncate(offset + length - 1)
+        self.assertEqual("/users/a", self.replay("/users/a"))
+        with self.assertRaises(github_api_cassette.CassetteMissError):
+            self.replay("/users/b")
+        self.assertEqual([tuple(first)], github_api_cassette.read_index(recorder.index_path, offset + length - 1))
+
+
+class HttpCacheTests(unittest.TestCase):
+    # Against an in-process stand-in, which answers If-None-Match with a 304. The cache's clock is set by the tests.
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = github_api_server.start(repos=2000, users=1000)
+        cls.addClassCleanup(cls.server.shutdown)
+        cls.addClassCleanup(cls.server.server_close)
+
+    class Wire:
+        # Layer below the cache: the responses that came from the server.
+        order = 40
+
+        def __init__(self):
+            self.responses = []
+
+        def __call__(self, request, send, **kwargs):
+            response = send(request, **kwargs)
+            self.responses.append(response)
+            return response
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.client = github_api_client.GithubClient(self.server.url, self.server.url + "/raw", token="good1")
+        self.addCleanup(self.client.session.close)
+        self.cache = self.client.use(github_api_cache.HttpCache(os.path.join(directory.name, "cache.sqlite"),
+                                                                raw_url=self.client.raw_url))
+        self.addCleanup(self.cache.close)
+        self.wire = self.client.use(self.Wire())
+        self.now = 1_000_000.0
+        clock = unittest.mock.patch("github_api_cache.time.time", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_fresh_response_is_served_without_request(self):
+        first = self.client.get("/users/renataberoli").json()
+        self.now += 3599
+        self.assertEqual(first, self.client.get("/users/renataberoli").json())
+        self.assertEqual(1, len(self.wire.responses))
+        self.assertEqual((1, 1, 0), (self.cache.misses, self.cache.hits, self.cache.revalidations))
+
+    def test_expired_response_is_revalidated(self):
+        first = self.client.get("/users/renataberoli").json()
+        self.now += 3601
+        response = self.client.get("/users/renataberoli", stream=True)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(first, response.json())
+        not_modified = self.wire.responses[-1]
+        self.assertEqual(304, not_modified.status_code)
+        self.assertTrue(not_modified.raw.closed)
+        self.assertEqual((1, 0, 1), (self.cache.misses, self.cache.hits, self.cache.revalidations))
+        # Fresh again from the revalidation.
+        self.now += 3599
+        self.client.get("/users/renataberoli")
+        self.assertEqual(2, len(self.wire.responses))
+
+    def test_least_recently_used_is_evicted(self):
+        paths = [f"/search/repositories?q=python&per_page=5&page={page}" for page in (1, 2, 3)]
+        for path in paths[:2]:
+            self.now += 1
+            self.client.get(path)
+        # Room for about two responses, the first one is used again before the third is stored.
+        self.cache.max_size = self.cache.db.execute("SELECT SUM(size) FROM responses").fetchone()[0] + 256
+        self.now += 1
+        self.client.get(paths[0])
+        self.now += 1
+        self.client.get(paths[2])
+        stored = [self.cache.load(github_api_client.request_key(self.wire.responses[index].request)) is not None
+                  for index in range(3)]
+        self.assertEqual([True, False, True], stored)
+        self.assertEqual(1, self.cache.evictions)
+
+
+class LatencyBudgetTests(unittest.TestCase):
+
+    class Search(unittest.TestCase):
+        client = None
+        search_path = "repositories"
+
+        def test_search(self):
+            self.make_request("q=python+in:name")
+
+    def check(self, samples, **settings):
+        github_api_latency.configure(True, **settings)
+        self.addCleanup(github_api_latency.configure, False)
+        with unittest.mock.patch("github_api_latency.measure", lambda *args: samples):
+            test_case = self.Search("test_search")
+            github_api_latency.check(test_case, self.Search.test_search, {95: 800})
+        return github_api_latency.results
+
+    def test_over_budget_fails(self):
+        with self.assertRaisesRegex(AssertionError, "p95 of 'q=python\\+in:name' is 9\\d\\d ms, over the 800 ms"):
+            self.check([900.0, 950.0])
+
+    def test_report_only_never_fails(self):
+        results = self.check([900.0, 950.0], report_only=True)
+        self.assertEqual([[(95, results[0].percentiles[95], 800)]], [result.broken for result in results])
+        self.assertTrue(github_api_latency.summary().startswith("latency budgets (report only): 1 searches measured, "
+                                                                "1 over budget"))
+
+    def test_report_only_skips_failed_measurements(self):
+        def measure(*args):
+            raise AssertionError("Latency measurement of 'q=python+in:name' got status 403.")
+
+        github_api_latency.configure(True, report_only=True)
+        self.addCleanup(github_api_latency.configure, False)
+        with unittest.mock.patch("github_api_latency.measure", measure):
+            github_api_latency.check(self.Search("test_search"), self.Search.test_search, {95: 800})
+        self.assertEqual([], github_api_latency.results)
+
+
+if __name__ == '__main__':
+    unittest.main()